@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Measures command dispatch throughput against matching every pattern in turn
+
+Run from repository root: python -m benchmarks.dispatch
+"""
+from random import Random
+from time import perf_counter
+from typing import Callable, List
+
+from router import Router
+
+
+COMMANDS = [
+    (r"/?(?:help|commands|команды|помощь)", 'help', 'commands', 'команды', 'помощь'),
+    (r'/?gpt\s+([\s\S]+)', 'gpt'),
+    (r"/?(?:группа|group)\s+(\w{1,3}(?:[\s.\-]\d{1,3})+)", 'группа', 'group'),
+    (r"/?(fore|back|фронт|бек|бэк|teacher|time|учитель|время)\s+(#[0-9a-fA-F]{8}|#[0-9a-fA-F]{6})",
+     'fore', 'back', 'фронт', 'бек', 'бэк', 'teacher', 'time', 'учитель', 'время'),
+    (r"/?(?:расписание|timetable)", 'расписание', 'timetable'),
+    (r"/?(?:след\s+неделя|следующая\s+неделя|next\s+week)", 'след', 'следующая', 'next'),
+    (r"\A\s*/?\s*(сегодня|today|завтра|tomorrow)\s*\Z", 'сегодня', 'today', 'завтра', 'tomorrow'),
+    (r"/?(?:dm|дм)([\s\S]+)?", 'dm', 'дм'),
+    (r'/?(top|топ|down|низ)(\s+(?:chat|чат))?', 'top', 'топ', 'down', 'низ'),
+    (r'\A\s*/?карма\s*\Z', 'карма'),
+    (r'/?([+\-])', '+', '-'),
+    (r'/?рассылка ([\s\S]+)', 'рассылка'),
+    (r'\A\s*/?(?:stats|статистика)\s*\Z', 'stats', 'статистика'),
+    (r'/?(?:жмых|seam carve)(?:\s+(\d{1,3}))?', 'жмых', 'seam carve'),
+    (r'/?(?:login|логин|вход|auth)\s+(\S+)\s+(\S+)', 'login', 'логин', 'вход', 'auth'),
+    (r"/?(?:оценки|grades)", 'оценки', 'grades'),
+]
+MESSAGES = [
+    '/расписание', 'сегодня', '/группа ИС 21', '+', 'топ чат', '/dm привет', 'жмых 40',
+    'привет всем', 'кто идёт на пары завтра?', 'ахахаха', 'скиньте дз по физике пожалуйста',
+    'ну и погода сегодня', 'го в столовку', 'да', 'ок', 'а когда экзамен', 'ты где',
+    'лол', 'спасибо!', 'я опоздаю минут на 10', 'кто-нибудь знает кабинет?',
+]
+
+
+async def handler(*_):
+    pass
+
+
+def measure(find: Callable[[str], object], messages: List[str]) -> float:
+    """Returns messages per second"""
+    start = perf_counter()
+    for text in messages:
+        find(text)
+    return len(messages) / (perf_counter() - start)
+
+
+def main(count: int = 200000):
+    router = Router()
+    for pattern, *keywords in COMMANDS:
+        router.command(pattern, *keywords)(handler)
+
+    def sequential(text: str):
+        for route in router.routes:
+            match = route.pattern.match(text)
+            if match is not None:
+                return route, match
+        return None
+
+    rand = Random(0)
+    messages = [rand.choice(MESSAGES) for _ in range(count)]
+    plain = [text for text in messages if router.find(text) is None]
+    print(f'{len(messages) - len(plain)} commands, {len(plain)} plain messages')
+    for name, batch in (('mixed', messages), ('plain', plain)):
+        before = measure(sequential, batch)
+        after = measure(router.find, batch)
+        print(f'{name}: {before:,.0f} -> {after:,.0f} messages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Measures per-image render time with cold and warm text caches and with cached layouts
+
+Run from repository root: python -m benchmarks.render
+"""
+from time import perf_counter
+from typing import Dict, Any, Callable
+
+from image import Img, metrics
+from image.sprites import SpriteCache
+
+
+SUBJECTS = ['Математика', 'Физика', 'Основы алгоритмизации и программирования', 'История', 'Иностранный язык']
+TEACHERS = ['Иванов И.И.', 'Петрова А.С.', 'Сидоров П.П.']
+TIMES = [('08:30', '10:00'), ('10:10', '11:40'), ('12:10', '13:40'), ('13:50', '15:20')]
+DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
+
+
+def timetable() -> Dict[str, Any]:
+    """Returns synthetic timetable of one week"""
+    return {
+        'week_number': 12,
+        'days': [
+            {
+                'title': title,
+                'lessons': [
+                    {
+                        'time': [str(j + 1), *TIMES[j]],
+                        'title': SUBJECTS[(i + j) % len(SUBJECTS)],
+                        'teacher': TEACHERS[(i + j) % len(TEACHERS)],
+                        'classroom': str(100 + j)
+                    }
+                    for j in range(len(TIMES))
+                ]
+            }
+            for i, title in enumerate(DAYS)
+        ]
+    }
+
+
+def measure(img: Img, render: Callable[[], Any], count: int, cold: bool, layouts: bool = False) -> float:
+    """Returns average render time in milliseconds
+
+    :param img: renderer
+    :param render: renders one image
+    :param count: count of renders
+    :param cold: clears text measurement and sprite caches before every render
+    :param layouts: keeps cached layouts, otherwise every render builds layout
+    """
+    total = 0
+    for _ in range(count):
+        if not layouts:
+            img.layouts.clear()
+        if cold:
+            metrics.cache_clear()
+            img.sprites = SpriteCache(img.sprites.max_size)
+        start = perf_counter()
+        render()
+        total += perf_counter() - start
+    return total / count * 1000
+
+
+def main(count: int = 50):
+    img = Img()
+    data = timetable()
+    colors = ('#212121', '#fefefe', '#cecece', '#98cd98')
+    cases = {
+        'from_timetable': lambda: img.from_timetable(data, *colors),
+        'from_day': lambda: img.from_day(data['days'][0], *colors),
+    }
+    for name, render in cases.items():
+        before = measure(img, render, count, True)
+        after = measure(img, render, count, False)
+        cached = measure(img, render, count, False, True)
+        print(f'{name}: {before:.2f} ms -> {after:.2f} ms per image, {cached:.2f} ms with cached layout '
+              f'({count} renders)')
+    for name, info in metrics.stats().items():
+        print(f"{name}: {info['hits']} hits, {info['misses']} misses")
+    sprites = img.sprites.stats()
+    print(f"sprites: {sprites['hits']} hits, {sprites['misses']} misses")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Provides Broadcaster class"""
+from asyncio import CancelledError, Lock, Task, create_task, gather, sleep
+from time import monotonic
+from typing import Any, Dict, List, NoReturn, Set, Tuple
+
+from vkbottle import API
+
+from db import DB
+
+
+def random_id(broadcast_id: int, batch: int, call: int) -> int:
+    """Returns the same random_id for every attempt, so VK drops repeated messages
+
+    :param broadcast_id: broadcast ID
+    :param batch: batch number
+    :param call: messages.send call number in batch
+    """
+    return (broadcast_id * 1000003 + batch * 25 + call) % 2 ** 31
+
+
+class Broadcaster:
+    """Sends message to all chats
+
+    Every batch is one `execute` request with up to `calls` messages.send
+    calls of up to `peers` peers. Batches are sent by `concurrency` workers
+    with at most `rate` requests per second and retried with exponential
+    backoff. Batch results are saved, so interrupted broadcast is resumed
+    from the first unsent batch.
+    """
+    def __init__(
+            self,
+            api: API,
+            db: DB,
+            concurrency: int = 3,
+            rate: float = 15,
+            retries: int = 5,
+            backoff: float = 1,
+            calls: int = 25,
+            peers: int = 100
+    ):
+        """
+        :param api: VK API
+        :param db: database
+        :param concurrency: count of simultaneous requests
+        :param rate: maximum of requests per second
+        :param retries: attempts to send batch after the first one
+        :param backoff: seconds before the first retry, doubled on every next one
+        :param calls: messages.send calls in one execute request, VK allows 25
+        :param peers: peers in one messages.send call, VK allows 100
+        """
+        self.api = api
+        self.db = db
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.calls = calls
+        self.peers = peers
+        self.requests = 0
+        self.retried = 0
+        self._lock = Lock()
+        self._next_request = 0.0
+        self._tasks: Set[Task] = set()
+
+    async def start(self, text: str, admin_id: int) -> Tuple[int, int]:
+        """Saves broadcast and sends it in background
+
+        :param text: message text
+        :param admin_id: user ID who gets delivery report
+        :return: broadcast ID and count of recipients
+        """
+        peers = await self.db.get_chat_ids()
+        size = self.calls * self.peers
+        batches = [','.join(map(str, peers[i:i + size])) for i in range(0, len(peers), size)]
+        broadcast_id = await self.db.create_broadcast(text, admin_id, len(peers), batches)
+        self._spawn(self._run(broadcast_id, text, admin_id))
+        return broadcast_id, len(peers)
+
+    async def resume(self) -> NoReturn:
+        """Continues interrupted broadcasts"""
+        for broadcast_id, text, admin_id in await self.db.get_unfinished_broadcasts():
+            self._spawn(self._run(broadcast_id, text, admin_id))
+
+    async def stop(self) -> NoReturn:
+        """Interrupts sending, unsent batches are resumed after restart"""
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns requests counters"""
+        return {'running': len(self._tasks), 'requests': self.requests, 'retried': self.retried}
+
+    def _spawn(self, coro) -> NoReturn:
+        task = create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, broadcast_id: int, text: str, admin_id: int) -> NoReturn:
+        try:
+            batches = await self.db.get_broadcast_batches(broadcast_id)
+
+            async def worker():
+                while batches:
+                    batch, peers = batches.pop(0)
+                    await self._send_batch(broadcast_id, batch, peers.split(','), text)
+            await gather(*[worker() for _ in range(self.concurrency)])
+            total, delivered, failed = await self.db.finish_broadcast(broadcast_id)
+            await self.api.messages.send(
+                peer_id=admin_id, random_id=random_id(broadcast_id, -1, 0),
+                message=f'📨 Рассылка {broadcast_id} закончить: доставить {delivered} из {total}, ошибка {failed}.'
+            )
+        except CancelledError:
+            raise
+        except Exception as e:
+            print(f"Failed to broadcast {broadcast_id}: {e!r}")
+
+    async def _send_batch(self, broadcast_id: int, batch: int, peers: List[str], text: str) -> NoReturn:
+        chunks = [peers[i:i + self.peers] for i in range(0, len(peers), self.peers)]
+        code = 'return [' + ','.join(
+            f'API.messages.send({{"peer_ids": "{",".join(chunk)}", "message": Args.message, '
+            f'"random_id": {random_id(broadcast_id, batch, i)}}})'
+            for i, chunk in enumerate(chunks)
+        ) + '];'
+        for attempt in range(self.retries + 1):
+            await self._throttle()
+            try:
+                response = await self.api.request('execute', {'code': code, 'message': text})
+                break
+            except CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"Failed to send broadcast {broadcast_id} batch {batch}: {e!r}")
+                    await self.db.finish_batch(broadcast_id, batch, False, 0, len(peers))
+                    return
+                self.retried += 1
+                await sleep(self.backoff * 2 ** attempt)
+        delivered, failed = self._count(response.get('response') or [], chunks)
+        await self.db.finish_batch(broadcast_id, batch, True, delivered, failed)
+
+    @staticmethod
+    def _count(results: List[Any], chunks: List[List[str]]) -> Tuple[int, int]:
+        delivered = failed = 0
+        for result, chunk in zip(results, chunks):
+            # Failed call of execute is false, successful one is a list of per peer results
+            if not isinstance(result, list):
+                failed += len(chunk)
+                continue
+            for peer in result:
+                if 'error' in peer:
+                    failed += 1
+                else:
+                    delivered += 1
+        failed += sum(len(chunk) for chunk in chunks[len(results):])
+        return delivered, failed
+
+    async def _throttle(self) -> NoReturn:
+        async with self._lock:
+            now = monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + 1 / self.rate
+            self.requests += 1
+        if wait > 0:
+            await sleep(wait)
@@ -1,30 +1,99 @@
 # -*- coding: utf-8 -*-
 """Provides CollegeAPI class"""
 from datetime import datetime
-from re import match, sub, IGNORECASE
-from typing import List, Dict, Any, Optional, NoReturn, Literal
+from json import load, dump
+from os import replace
+from re import sub
+from typing import List, Dict, Any, Optional, NoReturn, Literal, Tuple, Callable
 
-from requests import Session
+from requests import Session, RequestException
+
+from .cache import TimetableCache
+from .diff import Change, diff_timetables
+from .groups import GroupIndex
+from .store import TimetableStore
 
 
 class CollegeAPI:
     """Provides working with KTC API"""
     URL = "http://mob.kansk-tc.ru/ktc-api/"
+    HEADERS = {'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'}
 
-    def __init__(self):
+    def __init__(
+            self,
+            timeout: float = 10,
+            cache: Optional[TimetableCache] = None,
+            snapshot: Optional[str] = 'courses.json',
+            store: Optional[TimetableStore] = None
+    ):
+        """Initializes class and fetches courses
+
+        :param timeout: request timeout in seconds
+        :param cache: timetable cache, None disables caching
+        :param snapshot: path to last known courses file, None disables it
+        :param store: persistent timetable store used when college site is down,
+            it is required by `on_change` listeners
+        """
         self.client = Session()
+        self.client.headers.update(CollegeAPI.HEADERS)
+        self.timeout = timeout
+        self.cache = cache
+        self.snapshot = snapshot
+        self.store = store
+        self.on_change: List[Callable[[int, Dict[str, Any], List[Change]], Any]] = []
         self.courses = None
+        self.groups = GroupIndex()
         self._init()
 
     def _init(self) -> NoReturn:
-        self.courses = self.get_courses()
+        try:
+            self.refresh_courses()
+        except Exception:
+            # College site is down, use last known courses
+            courses = self._load_snapshot()
+            if courses is None:
+                raise
+            self._set_courses(courses, False)
+
+    def _set_courses(self, courses: List[Dict[str, Any]], save: bool = True) -> NoReturn:
+        # Index is built aside and swapped in, so lookups never see a partial one
+        groups = GroupIndex(courses)
+        self.courses, self.groups = courses, groups
+        if save:
+            self._save_snapshot(courses)
+
+    def _load_snapshot(self) -> Optional[List[Dict[str, Any]]]:
+        if self.snapshot is None:
+            return None
+        try:
+            with open(self.snapshot, 'r', encoding='utf-8') as f:
+                return load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_snapshot(self, courses: List[Dict[str, Any]]) -> NoReturn:
+        if self.snapshot is None:
+            return
+        # Write aside and rename, so snapshot is never half written
+        with open(self.snapshot + '.tmp', 'w', encoding='utf-8') as f:
+            dump(courses, f, ensure_ascii=False)
+        replace(self.snapshot + '.tmp', self.snapshot)
+
+    def refresh_courses(self) -> NoReturn:
+        """Fetches courses and rebuilds group index"""
+        self._set_courses(self.get_courses())
+
+    def _get(self, path: str) -> Any:
+        response = self.client.get(f'{CollegeAPI.URL}{path}', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
 
     def get_courses(self) -> List[Dict[str, Any]]:
         """Fetches courses
 
         :return: courses data
         """
-        return self.client.get(f'{CollegeAPI.URL}courses/1').json()
+        return self._get('courses/1')
 
     def get_timetable(self, group_id: int, week: Optional[int] = None) -> Dict[str, Any]:
         """Fetches timetable
@@ -33,9 +102,52 @@ class CollegeAPI:
         :param week: week number
         :return: timetable data
         """
-        if week is None:
-            return self.client.get(f'{CollegeAPI.URL}timetable/{group_id}').json()
-        return self.client.get(f'{CollegeAPI.URL}timetable/{group_id}/{week}').json()
+        if self.cache is None:
+            return self._fetch_timetable(group_id, week)
+        timetable, fresh = self.cache.lookup((group_id, week))
+        if not fresh:
+            timetable = self._fetch_timetable(group_id, week)
+            self._cache_timetable((group_id, week), timetable)
+        return timetable
+
+    def _cache_timetable(self, key: Tuple[int, Optional[int]], timetable: Dict[str, Any]) -> NoReturn:
+        # Stored timetable is not cached, so the site is asked again on the next read
+        if self.cache is not None and 'stale_since' not in timetable:
+            self.cache.put(key, timetable)
+
+    def _fetch_timetable(self, group_id: int, week: Optional[int] = None) -> Dict[str, Any]:
+        try:
+            if week is None:
+                timetable = self._get(f'timetable/{group_id}')
+            else:
+                timetable = self._get(f'timetable/{group_id}/{week}')
+        except (RequestException, ValueError):
+            timetable = self._stored_timetable(group_id, week)
+            if timetable is None:
+                raise
+            return timetable
+        self._store_timetable(group_id, week, timetable)
+        return timetable
+
+    def _stored_timetable(self, group_id: int, week: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        if self.store is None:
+            return None
+        return self.store.get(group_id, week)
+
+    def _store_timetable(self, group_id: int, week: Optional[int], timetable: Dict[str, Any]) -> NoReturn:
+        if self.store is None:
+            return
+        self._notify(group_id, timetable, self.store.put(group_id, timetable, week is None))
+
+    def _notify(self, group_id: int, timetable: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> NoReturn:
+        if previous is not None:
+            changes = diff_timetables(previous, timetable)
+            if changes:
+                self._changed(group_id, timetable, changes)
+
+    def _changed(self, group_id: int, timetable: Dict[str, Any], changes: List[Change]) -> NoReturn:
+        for listener in self.on_change:
+            listener(group_id, timetable, changes)
 
     def get_day(
             self,
@@ -49,43 +161,64 @@ class CollegeAPI:
         :param day: day number
         :param tomorrow: needs tomorrow day
         """
+        index, next_week = self._day_index(day, tomorrow)
+        if index is None:
+            return
         timetable = self.get_timetable(group_id)
+        if next_week:
+            timetable = self.get_timetable(group_id, int(timetable['week_number']))
+        return self._select_day(timetable, index)
+
+    @staticmethod
+    def _select_day(timetable: Dict[str, Any], index: int) -> Dict[str, Any]:
+        day = timetable['days'][index]
+        if 'stale_since' in timetable:
+            day = {**day, 'stale_since': timetable['stale_since']}
+        return day
+
+    @staticmethod
+    def _day_index(
+            day: Optional[int] = None,
+            tomorrow: Optional[bool] = False
+    ) -> Tuple[Optional[int], bool]:
+        """Returns day index and True, if it is in the next week
+
+        :param day: day number
+        :param tomorrow: needs tomorrow day
+        """
         if day is None:
             today = datetime.now().weekday()
             if tomorrow:
                 # Get next date
                 if today >= 5:
                     # Next week, because 6 is Sunday
-                    today = 0
-                    timetable = self.get_timetable(group_id, int(timetable['week_number']))
-                else:
-                    today += 1
-                return timetable['days'][today]
-            return timetable['days'][today]
+                    return 0, True
+                today += 1
+            return today, False
         elif 0 <= day <= 6:
-            return timetable['days'][day]
+            return day, False
+        return None, False
 
-    def get_group(self, pattern: str) -> Dict[str, Any]:
-        """Returns True, if group exists
+    def get_group(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns group by title or unique title prefix
+
+        :param name: group title
+        """
+        return self.groups.find(name)
+
+    def suggest_group(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns group with similar title to ask user about
 
-        :param pattern: group title regex pattern
+        :param name: group title
         """
-        if self.courses is not None:
-            for course in self.courses:
-                for group in course['groups']:
-                    if match(pattern, group['title'], IGNORECASE):
-                        return group
+        return self.groups.suggest(name)
 
-    def has_group(self, pattern: str) -> bool:
+    def has_group(self, name: str) -> bool:
         """Returns True, if group exists
 
-        :param pattern: group title regex pattern
+        :param name: group title
         """
-        if self.courses is not None:
-            for course in self.courses:
-                for group in course['groups']:
-                    if match(pattern, group['title'], IGNORECASE):
-                        return True
+        return self.groups.find(name) is not None
 
     @staticmethod
     def to_group_name(name: str) -> str:
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Provides ACollegeAPI class"""
+from asyncio import Task, TimeoutError, create_task, get_running_loop, shield
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, NoReturn, Literal, Set
+
+from aiohttp import ClientSession, ClientTimeout, ClientError, TCPConnector
+
+from . import CollegeAPI
+from .cache import TimetableCache, Key
+from .diff import Change
+from .groups import GroupIndex
+from .store import TimetableStore
+
+
+class ACollegeAPI(CollegeAPI):
+    """Provides non-blocking working with KTC API
+
+    Requests share one keep-alive connection pool, so the bot never waits
+    on the college site while other chats are served.
+    """
+    def __init__(
+            self,
+            timeout: float = 10,
+            pool_size: int = 16,
+            keepalive: float = 30,
+            cache: Optional[TimetableCache] = None,
+            snapshot: Optional[str] = 'courses.json',
+            store: Optional[TimetableStore] = None
+    ):
+        """Initializes class without network requests, use `init` to load courses
+
+        :param timeout: request timeout in seconds
+        :param pool_size: maximum of simultaneous connections
+        :param keepalive: keep-alive timeout of idle connection in seconds
+        :param cache: timetable cache, None disables caching
+        :param snapshot: path to last known courses file, None disables it
+        :param store: persistent timetable store used when college site is down,
+            it is required by `on_change` listeners
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.cache = cache
+        self.snapshot = snapshot
+        self.store = store
+        self.on_change = []
+        self.client: Optional[ClientSession] = None
+        self.courses = None
+        self.groups = GroupIndex()
+        self.requests = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, Task] = {}
+        self._refreshing: Set[Key] = set()
+        self._tasks: Set[Task] = set()
+        # The only thread of store, so its synchronous commits never block the loop
+        self._store_executor = ThreadPoolExecutor(1, thread_name_prefix='timetable-store')
+
+    async def init(self) -> NoReturn:
+        """Loads last known courses and fetches actual ones in background"""
+        courses = self._load_snapshot()
+        if courses is not None:
+            self._set_courses(courses, False)
+        self._spawn(self._init_courses())
+
+    async def _init_courses(self) -> NoReturn:
+        try:
+            await self.refresh_courses()
+        except Exception as e:
+            print(f"Failed to fetch courses: {e!r}")
+
+    def _spawn(self, coro) -> Task:
+        # Keeps reference to background task until it is done
+        task = create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def refresh_courses(self) -> NoReturn:
+        """Fetches courses and rebuilds group index"""
+        self._set_courses(await self.get_courses())
+
+    async def close(self) -> NoReturn:
+        """Closes connection pool"""
+        if self.client is not None and not self.client.closed:
+            await self.client.close()
+        self.client = None
+        self._store_executor.shutdown()
+
+    def _session(self) -> ClientSession:
+        # Session must be created inside running event loop
+        if self.client is None or self.client.closed:
+            self.client = ClientSession(
+                connector=TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive),
+                timeout=ClientTimeout(total=self.timeout),
+                headers=CollegeAPI.HEADERS,
+                auto_decompress=True
+            )
+        return self.client
+
+    async def _get(self, path: str) -> Any:
+        # Concurrent callers of the same URL await one shared request
+        url = f'{CollegeAPI.URL}{path}'
+        task = self._in_flight.get(url)
+        if task is None:
+            task = create_task(self._request(url))
+            self._in_flight[url] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(url, None))
+        else:
+            self.coalesced += 1
+        return await shield(task)
+
+    async def _request(self, url: str) -> Any:
+        self.requests += 1
+        async with self._session().get(url) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns upstream requests, coalesced calls and cache counters"""
+        stats = {'requests': self.requests, 'coalesced': self.coalesced}
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        return stats
+
+    async def get_courses(self) -> List[Dict[str, Any]]:
+        """Fetches courses
+
+        :return: courses data
+        """
+        return await self._get('courses/1')
+
+    async def get_timetable(self, group_id: int, week: Optional[int] = None) -> Dict[str, Any]:
+        """Fetches timetable
+
+        :param group_id: group unique ID
+        :param week: week number
+        :return: timetable data
+        """
+        if self.cache is None:
+            return await self._fetch_timetable(group_id, week)
+        key = (group_id, week)
+        timetable, fresh = self.cache.lookup(key)
+        if timetable is None:
+            timetable = await self._fetch_timetable(group_id, week)
+            self._cache_timetable(key, timetable)
+        elif not fresh and key not in self._refreshing:
+            # Serve stale timetable and revalidate it in background
+            self._refreshing.add(key)
+            self._spawn(self._revalidate(key))
+        return timetable
+
+    async def refresh_timetable(self, group_id: int, week: Optional[int] = None) -> Dict[str, Any]:
+        """Fetches timetable bypassing fresh cache entry and stores it
+
+        :param group_id: group unique ID
+        :param week: week number
+        :return: timetable data
+        """
+        timetable = await self._fetch_timetable(group_id, week)
+        self._cache_timetable((group_id, week), timetable)
+        return timetable
+
+    async def _revalidate(self, key: Key) -> NoReturn:
+        try:
+            await self.refresh_timetable(*key)
+        except Exception as e:
+            print(f"Failed to refresh timetable {key}: {e!r}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def _fetch_timetable(self, group_id: int, week: Optional[int] = None) -> Dict[str, Any]:
+        try:
+            if week is None:
+                timetable = await self._get(f'timetable/{group_id}')
+            else:
+                timetable = await self._get(f'timetable/{group_id}/{week}')
+        except (ClientError, TimeoutError, ValueError):
+            timetable = await self._in_store(self._stored_timetable, group_id, week)
+            if timetable is None:
+                raise
+            return timetable
+        if self.store is not None:
+            self._notify(group_id, timetable, await self._in_store(self.store.put, group_id, timetable, week is None))
+        return timetable
+
+    async def _in_store(self, function, *args) -> Any:
+        return await get_running_loop().run_in_executor(self._store_executor, function, *args)
+
+    def _changed(self, group_id: int, timetable: Dict[str, Any], changes: List[Change]) -> NoReturn:
+        # Listeners are coroutine functions, they must not delay the fetch
+        for listener in self.on_change:
+            self._spawn(listener(group_id, timetable, changes))
+
+    async def get_day(
+            self,
+            group_id: int,
+            day: Optional[Literal[0, 1, 2, 3, 4, 5]] = None,
+            tomorrow: Optional[bool] = False
+    ) -> Dict[str, Any]:
+        """Fetches current day timetable
+
+        :param group_id: group unique ID
+        :param day: day number
+        :param tomorrow: needs tomorrow day
+        """
+        index, next_week = self._day_index(day, tomorrow)
+        if index is None:
+            return
+        timetable = await self.get_timetable(group_id)
+        if next_week:
+            timetable = await self.get_timetable(group_id, int(timetable['week_number']))
+        return self._select_day(timetable, index)
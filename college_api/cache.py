@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Provides TimetableCache class"""
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Any, Optional, NoReturn, Tuple
+
+Key = Tuple[int, Optional[int]]
+
+
+class TimetableCache:
+    """LRU cache of timetables keyed by (group_id, week_number)
+
+    Week number `None` means the current week.
+    """
+    def __init__(
+            self,
+            ttl: float = 60 * 15,
+            stale_ttl: float = 60 * 60 * 24,
+            max_size: int = 512
+    ):
+        """Initializes empty cache
+
+        :param ttl: seconds while entry is fresh
+        :param stale_ttl: seconds while expired entry still may be served during refresh
+        :param max_size: maximum of entries
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Key, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(self, key: Key) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Returns cached timetable and True, if it is fresh
+
+        :param key: (group_id, week_number)
+        :return: timetable or None, if it is missing or too old
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+        age = monotonic() - entry[0]
+        if age > self.ttl + self.stale_ttl:
+            del self._data[key]
+            self.misses += 1
+            return None, False
+        self._data.move_to_end(key)
+        if age > self.ttl:
+            self.stale_hits += 1
+            return entry[1], False
+        self.hits += 1
+        return entry[1], True
+
+    def put(self, key: Key, timetable: Dict[str, Any]) -> NoReturn:
+        """Stores timetable and evicts least recently used entries
+
+        :param key: (group_id, week_number)
+        :param timetable: timetable data
+        """
+        self._data[key] = (monotonic(), timetable)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[Key] = None) -> NoReturn:
+        """Removes entry or all entries
+
+        :param key: (group_id, week_number), None clears cache
+        """
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters"""
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+        }
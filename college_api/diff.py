@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Provides timetable diff engine"""
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class Change:
+    """One lesson change between two timetable payloads"""
+    ADDED = 'added'
+    REMOVED = 'removed'
+    MOVED = 'moved'
+    TEACHER = 'teacher'
+    CLASSROOM = 'classroom'
+
+    def __init__(
+            self,
+            kind: str,
+            lesson: Dict[str, Any],
+            day: str,
+            old: Optional[str] = None,
+            new: Optional[str] = None
+    ):
+        """
+        :param kind: one of Change.ADDED, REMOVED, MOVED, TEACHER, CLASSROOM
+        :param lesson: lesson data (new one, if it exists)
+        :param day: day title of lesson
+        :param old: previous value (day title and lesson number for moved lesson)
+        :param new: actual value
+        """
+        self.kind = kind
+        self.lesson = lesson
+        self.day = day
+        self.old = old
+        self.new = new
+
+    def __repr__(self) -> str:
+        return f"Change[{self.kind}] {self.day} {self.lesson['title']} ({self.old} → {self.new})"
+
+
+Slot = Tuple[int, str, str]  # (day index, lesson number, lesson title)
+
+
+def _lessons(timetable: Dict[str, Any]) -> Dict[Slot, Dict[str, Any]]:
+    lessons = {}
+    for i, day in enumerate(timetable['days']):
+        for lesson in day['lessons']:
+            lessons.setdefault((i, lesson['time'][0], lesson['title']), lesson)
+    return lessons
+
+
+def diff_timetables(old: Dict[str, Any], new: Dict[str, Any]) -> List[Change]:
+    """Returns lessons added, removed or moved and teacher or classroom changes
+
+    :param old: previous timetable data
+    :param new: actual timetable data
+    """
+    old_lessons, new_lessons = _lessons(old), _lessons(new)
+
+    def day_title(timetable: Dict[str, Any], i: int) -> str:
+        return timetable['days'][i]['title']
+
+    changes = []
+    for slot in old_lessons.keys() & new_lessons.keys():
+        before, after = old_lessons[slot], new_lessons[slot]
+        for kind in (Change.TEACHER, Change.CLASSROOM):
+            if before[kind] != after[kind]:
+                changes.append(Change(kind, after, day_title(new, slot[0]), before[kind], after[kind]))
+
+    removed = {slot: old_lessons[slot] for slot in old_lessons.keys() - new_lessons.keys()}
+    added = {slot: new_lessons[slot] for slot in new_lessons.keys() - old_lessons.keys()}
+    for slot in sorted(added):
+        # Same lesson disappeared from another place, so it was moved
+        source = next((i for i in sorted(removed) if i[2] == slot[2]), None)
+        if source is None:
+            changes.append(Change(Change.ADDED, added[slot], day_title(new, slot[0])))
+            continue
+        del removed[source]
+        changes.append(Change(
+            Change.MOVED, added[slot], day_title(new, slot[0]),
+            f'{day_title(old, source[0])} {source[1]}', f'{day_title(new, slot[0])} {slot[1]}'
+        ))
+    for slot in sorted(removed):
+        changes.append(Change(Change.REMOVED, removed[slot], day_title(old, slot[0])))
+    return changes
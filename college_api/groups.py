@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Provides GroupIndex class"""
+from bisect import bisect_left
+from collections import Counter
+from re import sub
+from typing import List, Dict, Any, Optional, Set
+
+
+class GroupIndex:
+    """Immutable index of groups by normalized title
+
+    Lookup tries exact title, then unique title prefix. Similar titles are
+    only suggested, they must have the same digits, because group titles
+    differ by year and number only. Letters looking like digits are compared
+    as digits.
+    """
+    DIGITS = str.maketrans('OО', '00')
+
+    def __init__(
+            self,
+            courses: Optional[List[Dict[str, Any]]] = None,
+            similarity: float = 0.6,
+            min_prefix: int = 4
+    ):
+        """Builds index from courses
+
+        :param courses: courses data
+        :param similarity: minimal trigram similarity of suggested title (0..1)
+        :param min_prefix: minimal length of normalized title prefix
+        """
+        self.similarity = similarity
+        self.min_prefix = min_prefix
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        for course in courses or []:
+            for group in course['groups']:
+                title = GroupIndex.normalize(group['title'])
+                self._groups.setdefault(title, group)
+        for title in self._groups:
+            for trigram in GroupIndex.trigrams(title.translate(GroupIndex.DIGITS)):
+                self._trigrams.setdefault(trigram, set()).add(title)
+        self._titles = sorted(self._groups)
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """Returns uppercase title with "." as the only separator"""
+        return sub(r'([\.\s\-]+)', '.', name.strip().upper()).strip('.')
+
+    @staticmethod
+    def trigrams(title: str) -> Set[str]:
+        """Returns trigrams of padded title"""
+        title = f'  {title} '
+        return {title[i:i + 3] for i in range(len(title) - 2)}
+
+    @staticmethod
+    def digits(title: str) -> str:
+        """Returns digits of title, letters looking like digits are read as digits"""
+        return sub(r'\D', '', title.translate(GroupIndex.DIGITS))
+
+    def find(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns group by title or unique title prefix
+
+        :param name: group title
+        """
+        title = GroupIndex.normalize(name)
+        if not title:
+            return None
+        group = self._groups.get(title)
+        if group is not None:
+            return group
+        if len(title) < self.min_prefix:
+            return None
+        i = bisect_left(self._titles, title)
+        if i < len(self._titles) and self._titles[i].startswith(title):
+            if i + 1 == len(self._titles) or not self._titles[i + 1].startswith(title):
+                return self._groups[self._titles[i]]
+        return None
+
+    def suggest(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns group with similar title and the same digits
+
+        :param name: group title
+        """
+        title = GroupIndex.normalize(name)
+        if not title:
+            return None
+        digits = GroupIndex.digits(title)
+        trigrams = GroupIndex.trigrams(title.translate(GroupIndex.DIGITS))
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        best, best_score = None, self.similarity
+        for candidate, count in shared.items():
+            if GroupIndex.digits(candidate) != digits:
+                continue
+            size = len(GroupIndex.trigrams(candidate.translate(GroupIndex.DIGITS)))
+            score = count / (len(trigrams) + size - count)
+            if score > best_score or (best is None and score == best_score):
+                best, best_score = candidate, score
+        return None if best is None else self._groups[best]
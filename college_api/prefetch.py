@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Provides PrefetchScheduler class"""
+from asyncio import Semaphore, Task, create_task, gather, sleep, CancelledError
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable, List, NoReturn, Sequence
+
+from .aio import ACollegeAPI
+
+
+class PrefetchScheduler:
+    """Warms timetable cache of all served groups in background
+
+    Before each peak time every group is refreshed at once with limited
+    concurrency, between peaks groups are refreshed one by one spread evenly
+    over the interval. Courses are refreshed too, so new groups are found
+    without restart.
+    """
+    def __init__(
+            self,
+            college: ACollegeAPI,
+            group_ids: Callable[[], Awaitable[Iterable[int]]],
+            times: Sequence[str] = ('07:30', '17:00'),
+            concurrency: int = 4,
+            interval: float = 60 * 60,
+            courses_interval: float = 60 * 60 * 6
+    ):
+        """Initializes scheduler
+
+        :param college: async college API with cache
+        :param group_ids: returns unique IDs of served groups
+        :param times: local times "HH:MM" to warm all groups at
+        :param concurrency: maximum of simultaneous requests while warming
+        :param interval: seconds of one rolling refresh round
+        :param courses_interval: seconds between courses and group index refreshes
+        """
+        self.college = college
+        self.group_ids = group_ids
+        self.times = [tuple(map(int, t.split(':'))) for t in times]
+        self.concurrency = concurrency
+        self.interval = interval
+        self.courses_interval = courses_interval
+        self._tasks: List[Task] = []
+
+    def start(self) -> NoReturn:
+        """Starts peak, rolling and courses refresh in background"""
+        if not self._tasks:
+            self._tasks = [
+                create_task(self._peaks()),
+                create_task(self._rolling()),
+                create_task(self._courses())
+            ]
+
+    async def stop(self) -> NoReturn:
+        """Stops background refresh"""
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def warm(self) -> NoReturn:
+        """Refreshes current and next week of all groups"""
+        semaphore = Semaphore(self.concurrency)
+
+        async def warm_group(group_id: int):
+            async with semaphore:
+                await self._refresh(group_id)
+        await gather(*[warm_group(i) for i in set(await self.group_ids())])
+
+    async def _refresh(self, group_id: int) -> NoReturn:
+        try:
+            timetable = await self.college.refresh_timetable(group_id)
+            await self.college.refresh_timetable(group_id, int(timetable['week_number']) + 1)
+        except CancelledError:
+            raise
+        except Exception as e:
+            print(f"Failed to prefetch timetable {group_id}: {e!r}")
+
+    def _until_next_time(self) -> float:
+        now = datetime.now()
+        times = []
+        for hour, minute in self.times:
+            at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if at <= now:
+                at += timedelta(days=1)
+            times.append(at)
+        return (min(times) - now).total_seconds()
+
+    async def _peaks(self) -> NoReturn:
+        if not self.times:
+            return
+        while True:
+            await sleep(self._until_next_time())
+            await self.warm()
+
+    async def _rolling(self) -> NoReturn:
+        while True:
+            group_ids = list(set(await self.group_ids()))
+            if not group_ids:
+                await sleep(self.interval)
+                continue
+            delay = self.interval / len(group_ids)
+            for group_id in group_ids:
+                await self._refresh(group_id)
+                await sleep(delay)
+
+    async def _courses(self) -> NoReturn:
+        while True:
+            await sleep(self.courses_interval)
+            try:
+                await self.college.refresh_courses()
+            except CancelledError:
+                raise
+            except Exception as e:
+                print(f"Failed to refresh courses: {e!r}")
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Provides TimetableStore class"""
+from hashlib import sha1
+from json import dumps, loads
+from sqlite3 import connect
+from time import time
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class TimetableStore:
+    """Persistent storage of fetched timetables
+
+    Weeks are keyed by (group_id, week_number) and point to payloads
+    deduplicated by content hash, so unchanged weeks are never written twice.
+    """
+    def __init__(self, path: str = 'timetables.db'):
+        """Opens database and creates tables if they not exist
+
+        :param path: path to database file
+        """
+        self.db = connect(path, check_same_thread=False)
+        self.cursor = self.db.cursor()
+        self.cursor.execute('PRAGMA journal_mode = WAL')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS payload (
+                hash TEXT PRIMARY KEY,  -- sha1 of timetable JSON
+                data TEXT NOT NULL  -- timetable JSON
+            );
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS week (
+                group_id INTEGER NOT NULL,  -- group unique ID
+                week_number INTEGER NOT NULL,  -- week number
+                hash TEXT NOT NULL,  -- payload hash
+                changed_at INTEGER NOT NULL,  -- time when payload was changed
+                checked_at INTEGER NOT NULL,  -- time when payload was fetched last
+                PRIMARY KEY (group_id, week_number)
+            );
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS current_week (
+                group_id INTEGER PRIMARY KEY,  -- group unique ID
+                week_number INTEGER NOT NULL  -- last fetched current week number
+            );
+        ''')
+        self.db.commit()
+        self._hashes: Dict[Tuple[int, int], str] = {}
+
+    @staticmethod
+    def hash(timetable: Dict[str, Any]) -> str:
+        """Returns content hash of timetable"""
+        data = {k: v for k, v in timetable.items() if k != 'stale_since'}
+        return sha1(dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def put(self, group_id: int, timetable: Dict[str, Any], current: bool = False) -> Optional[Dict[str, Any]]:
+        """Stores fetched timetable
+
+        :param group_id: group unique ID
+        :param timetable: timetable data
+        :param current: True, if it is the current week
+        :return: previously stored timetable, if week was changed
+        """
+        now = int(time())
+        week_number = int(timetable['week_number'])
+        key = (group_id, week_number)
+        digest = TimetableStore.hash(timetable)
+        if key not in self._hashes:
+            row = self.cursor.execute(
+                'SELECT hash FROM week WHERE group_id = ? AND week_number = ?', key
+            ).fetchone()
+            if row is not None:
+                self._hashes[key] = row[0]
+        previous_digest = self._hashes.get(key)
+        previous = None
+        if previous_digest != digest:
+            if previous_digest is not None:
+                previous = loads(self.cursor.execute(
+                    'SELECT data FROM payload WHERE hash = ?', (previous_digest,)
+                ).fetchone()[0])
+            self.cursor.execute(
+                'INSERT OR IGNORE INTO payload (hash, data) VALUES (?, ?)',
+                (digest, dumps(timetable, ensure_ascii=False))
+            )
+            self.cursor.execute(
+                'INSERT INTO week (group_id, week_number, hash, changed_at, checked_at) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (group_id, week_number) '
+                'DO UPDATE SET hash = excluded.hash, changed_at = excluded.changed_at, '
+                'checked_at = excluded.checked_at',
+                (group_id, week_number, digest, now, now)
+            )
+            self._hashes[key] = digest
+        else:
+            self.cursor.execute(
+                'UPDATE week SET checked_at = ? WHERE group_id = ? AND week_number = ?',
+                (now, group_id, week_number)
+            )
+        if current:
+            self.cursor.execute(
+                'INSERT INTO current_week (group_id, week_number) VALUES (?, ?) '
+                'ON CONFLICT (group_id) DO UPDATE SET week_number = excluded.week_number',
+                key
+            )
+        self.db.commit()
+        return previous
+
+    def get(self, group_id: int, week: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Returns stored timetable marked with "stale_since" fetch time
+
+        :param group_id: group unique ID
+        :param week: week number, None is the last known current week
+        """
+        if week is None:
+            row = self.cursor.execute(
+                'SELECT week_number FROM current_week WHERE group_id = ?', (group_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            week = row[0]
+        row = self.cursor.execute(
+            'SELECT payload.data, week.checked_at FROM week '
+            'JOIN payload ON payload.hash = week.hash '
+            'WHERE week.group_id = ? AND week.week_number = ?',
+            (group_id, week)
+        ).fetchone()
+        if row is None:
+            return None
+        timetable = loads(row[0])
+        timetable['stale_since'] = row[1]
+        return timetable
+
+    def history(self, group_id: int) -> List[Tuple[int, int]]:
+        """Returns stored weeks of group
+
+        :param group_id: group unique ID
+        :return: list of (week_number, changed_at)
+        """
+        return self.cursor.execute(
+            'SELECT week_number, changed_at FROM week WHERE group_id = ? ORDER BY week_number',
+            (group_id,)
+        ).fetchall()
@@ -13,3 +13,50 @@ MESSAGE_STATE = 25  # After 25 messages sends random message
 MESSAGE_STATES = [
     # "message text"
 ]
+
+# college API connection
+COLLEGE_TIMEOUT = 10  # request timeout in seconds
+COLLEGE_POOL_SIZE = 16  # maximum of simultaneous connections
+TIMETABLE_TTL = 60 * 15  # timetable is fresh for 15 minutes
+TIMETABLE_STALE_TTL = 60 * 60 * 24  # stale timetable is served while refreshing
+TIMETABLE_CACHE_SIZE = 512  # maximum of cached weeks
+PREFETCH_TIMES = ['07:30', '17:00']  # warm timetables of all groups before peaks
+PREFETCH_CONCURRENCY = 4  # maximum of simultaneous requests while warming
+PREFETCH_INTERVAL = TIMETABLE_TTL * 0.8  # every group is refreshed before its cached timetable expires
+COURSES_INTERVAL = 60 * 60 * 6  # refresh courses and groups every 6 hours
+TIMETABLE_STORE = 'timetables.db'  # fetched timetables used when college site is down
+
+# rendered timetables
+RENDER_CACHE_SIZE = 4096  # maximum of cached attachments of rendered images
+RENDER_WORKERS = 2  # count of render processes
+RENDER_QUEUE = 32  # maximum of running and waiting renders
+IMAGE_FORMAT = 'PNG'  # PNG, JPEG or WEBP
+IMAGE_PALETTE = True  # encode timetables and grades as palette PNG
+IMAGE_OPTIMIZE = False  # spend more time on encoding to get smaller files
+IMAGE_COMPRESS_LEVEL = 6  # PNG compression level (0-9)
+RENDER_LAYOUTS = 64  # theme-independent timetable layouts cached by each render process
+RENDER_SPRITES = 1024  # pre-rasterized texts cached by each render process
+
+# database
+DB_PATH = 'chats.db'
+DB_COMMIT_WINDOW = 0.05  # writes within 50 ms share one commit
+DB_COMMIT_SIZE = 256  # maximum of writes in one commit
+PHRASES_SIZE = 2000  # last messages of each chat kept for random messages
+PHRASES_AGE = 60 * 60 * 24 * 30  # messages older than 30 days are evicted
+MARKOV_CACHE_SIZE = 64  # markov chains of the most active chats kept in memory
+DB_USERS_CACHE = 10000  # users kept in memory
+DB_CHATS_CACHE = 4096  # chats kept in memory
+LEADERBOARD_SIZE = 10  # users in top and bottom
+
+# broadcasts
+BROADCAST_CONCURRENCY = 3  # simultaneous execute requests
+BROADCAST_RATE = 15  # maximum of requests per second, VK allows 20 for groups
+BROADCAST_RETRIES = 5  # attempts to resend failed batch
+
+# photo downloads for dm and seam carving
+DOWNLOAD_CONCURRENCY = 4  # simultaneous photo downloads
+DOWNLOAD_TIMEOUT = 15  # photo download timeout in seconds
+DOWNLOAD_MAX_BYTES = 16 * 1024 * 1024  # larger photos are rejected
+DOWNLOAD_MAX_PIXELS = 25_000_000  # photos with more pixels are rejected
+DM_PHOTO_SIZE = 896  # the smallest photo side used for dm, the photo is resized to it
+SEAM_CARVE_PHOTO_SIZE = 604  # the smallest photo side used for seam carving, it is slow on large photos
@@ -1,55 +1,106 @@
 # -*- coding: utf-8 -*-
 from time import time
-from sqlite3 import connect
-from typing import Literal, NoReturn, List
+from asyncio import Future
+from sqlite3 import Connection, connect
+from typing import Any, Callable, Dict, Literal, NoReturn, List, Optional, Tuple
 
 from vkbottle import API
 
+from .cache import RecordCache
+from .leaderboard import Leaderboard
+from .migrations import migrate
+from .names import NameResolver
+from .writer import Writer
 from .types import Chat, User, ProCollege, PhraseState
 from config import MESSAGE_STATE, MESSAGE_STATES
 
 
+COLOR_COLUMNS = ('tt_back', 'tt_fore', 'tt_teacher', 'tt_time')
+DEFAULT_COLORS = ('#212121', '#fefefe', '#cecece', '#98cd98')
+
+
 class DB:
     """Provides convenient working with database"""
-    def __init__(self, api: API):
-        """Initializes class and create database if it not exists"""
+    def __init__(
+            self,
+            api: API,
+            path: str = 'chats.db',
+            window: float = 0.05,
+            batch_size: int = 256,
+            phrases_size: int = 2000,
+            phrases_age: int = 60 * 60 * 24 * 30,
+            users_size: int = 10000,
+            chats_size: int = 4096,
+            board_size: int = 10
+    ):
+        """Initializes class and create database if it not exists
+
+        Reads use own connection, writes are queued to the writer thread
+        and group-committed. Users and chats are cached write-through.
+
+        :param api: VK API
+        :param path: database path
+        :param window: seconds to collect writes into one commit
+        :param batch_size: maximum of writes in one commit
+        :param phrases_size: maximum of stored messages per chat
+        :param phrases_age: stored messages older than this count of seconds are evicted
+        :param users_size: maximum of cached users
+        :param chats_size: maximum of cached chats
+        :param board_size: count of users in cached top and bottom
+        """
         self.api = api
-        self.db = connect('chats.db')
+        self.names = NameResolver(api)
+        self.users = RecordCache(users_size)
+        self.chats = RecordCache(chats_size)
+        self.leaderboard = Leaderboard(board_size)
+        self.phrases_size = phrases_size
+        self.phrases_age = phrases_age
+        self.db = connect(path, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        migrate(self.db)
         self.cursor = self.db.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat (
-                id INTEGER NOT NULL,  -- chat unique ID
-                group_id INTEGER NOT NULL,  -- group unique ID
-                title TEXT NOT NULL,  -- group title
-                tt_back TEXT NOT NULL,  -- timetable background
-                tt_fore TEXT NOT NULL,  -- timetable foreground
-                tt_teacher TEXT NOT NULL, -- timetable teacher foreground
-                tt_time TEXT NOT NULL  -- timetable time foreground
-            );
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user (
-                id INTEGER NOT NULL,  -- user ID,
-                nickname TEXT NOT NULL,  -- user nickname
-                count INTEGER NOT NULL,  -- user count
-                last_vote INTEGER NOT NULL  -- last user vote time
-            );
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS procollege (
-                id INTEGER NOT NULL,  -- user ID
-                login TEXT NOT NULL,  -- user login
-                password TEXT NOT NULL
-            );
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS phraseState (
-                id INTEGER NOT NULL, -- chat ID
-                state INTEGER NOT NULL,  -- current state
-                phrases TEXT NOT NULL -- all phrases
-            );
-        ''')
-        self.db.commit()
+        self.writer = Writer(path, window, batch_size)
+
+    def _write(self, sql: str, params: tuple = ()) -> 'Future[Optional[tuple]]':
+        """Queues statement, future resolves with first returned row after commit"""
+        return self.writer.submit(lambda db: db.execute(sql, params).fetchone())
+
+    def _read(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        return self.cursor.execute(sql, params).fetchone()
+
+    async def run(self, job: Callable[[Connection], Any]) -> Any:
+        """Runs several statements in one transaction of the writer
+
+        :param job: function that receives writing connection
+        :return: job result
+        """
+        return await self.writer.submit(job)
+
+    def close(self) -> NoReturn:
+        """Commits queued writes and closes connections"""
+        self.writer.close()
+        self.db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns writer, caches and names counters"""
+        return {
+            **self.writer.stats(),
+            **{f'users_{k}': v for k, v in self.users.stats().items()},
+            **{f'chats_{k}': v for k, v in self.chats.stats().items()},
+            **{f'names_{k}': v for k, v in self.names.stats().items()},
+            'leaderboard_loads': self.leaderboard.loads,
+        }
+
+    def _user(self, row: tuple) -> User:
+        user = User.from_tuple(row)
+        self.users.put(user.uid, user)
+        self.leaderboard.update(user)
+        return user
+
+    def _chat(self, row: tuple) -> Chat:
+        chat = Chat.from_tuple(row)
+        self.chats.put(chat.chat_id, chat)
+        return chat
 
     async def get_or_add_user_hate_niggers(self, uid: int) -> User:
         """Get user or create new if it not exists
@@ -59,116 +110,315 @@ class DB:
         """
         if uid <= 0 or uid >= 2e9:
             return
-        user = self.cursor.execute('SELECT * FROM user WHERE id = ?', (uid,)).fetchone()
-        if user is None:
-            nickname = (await self.api.users.get(uid))[0].first_name
-            self.cursor.execute(
-                'INSERT INTO user (id, nickname, count, last_vote) VALUES (?, ?, ?, ?)',
-                (uid, nickname, 0, 0))
-            self.db.commit()
-            user = (uid, nickname, 0, 0)
-        return User.from_tuple(user)
-
-    def get_users(self, limit: int, need_reverse: bool = False) -> List[User]:
+        user = self.users.get(uid)
+        if user is not None:
+            return user
+        row = self._read('SELECT * FROM user WHERE id = ?', (uid,))
+        if row is None:
+            row = await self._write(
+                'INSERT INTO user (id, nickname, count, last_vote) VALUES (?, ?, 0, 0) '
+                'ON CONFLICT (id) DO UPDATE SET nickname = excluded.nickname RETURNING *',
+                (uid, await self.names.first_name(uid)))
+        return self._user(row)
+
+    async def get_users(self, limit: int, need_reverse: bool = False) -> List[User]:
         """Returns users top
 
         :param limit: users count limit
         :param need_reverse: need reverse users
         :return: users data
         """
+        users = self.leaderboard.get(limit, need_reverse)
+        if users is not None:
+            return users
+        users = [self._user(i) for i in self.cursor.execute(
+            f'SELECT * FROM user ORDER BY count {"ASC" if need_reverse else "DESC"} LIMIT ?',
+            (max(limit, self.leaderboard.size),)
+        ).fetchall()]
+        self.leaderboard.load(users, need_reverse)
+        return users[:limit]
+
+    async def get_chat_users(self, chat_id: int, limit: int, need_reverse: bool = False) -> List[User]:
+        """Returns users top by count in chat
+
+        :param chat_id: unique chat ID
+        :param limit: users count limit
+        :param need_reverse: need reverse users
+        :return: users data with count in chat
+        """
         data = self.cursor.execute(
-            f'SELECT * FROM user ORDER BY count {"ASC" if need_reverse else "DESC"} LIMIT ?', (limit,)
+            'SELECT user.id, user.nickname, chat_karma.count, user.last_vote FROM chat_karma '
+            'JOIN user ON user.id = chat_karma.user_id WHERE chat_karma.chat_id = ? '
+            f'ORDER BY chat_karma.count {"ASC" if need_reverse else "DESC"} LIMIT ?', (chat_id, limit)
         ).fetchall()
         return [User.from_tuple(i) for i in data]
 
-    async def inc_user_count(self, from_id: int, uid: int, by: int = 1) -> NoReturn:
-        """Increases/decreases user's count
+    async def vote(
+            self,
+            from_id: int,
+            uid: int,
+            by: int,
+            timeout: int,
+            chat_id: Optional[int] = None
+    ) -> Tuple[Optional[User], int]:
+        """Changes user's count in one transaction, if voter's cooldown is over
 
-        :param from_id: user ID who voted
+        :param from_id: user ID who votes
         :param uid: user ID
         :param by: count for inc/dec (1/-1)
+        :param timeout: seconds between votes of one user
+        :param chat_id: unique chat ID to change user's count in chat too
+        :return: user with changed count or None and seconds until voter can vote
         """
-        user = await self.get_or_add_user_hate_niggers(uid)
-        self.cursor.execute('UPDATE user SET count = ? WHERE id = ?', (user.count + by, uid))
-        user_voted = await self.get_or_add_user_hate_niggers(from_id)
-        self.cursor.execute('UPDATE user SET last_vote = ? WHERE id = ?', (int(time()), from_id))
-        self.db.commit()
+        user = self.users.get(uid)
+        if user is None:
+            row = self._read('SELECT * FROM user WHERE id = ?', (uid,))
+            user = self._user(row) if row is not None else None
+        nickname = user.nickname if user is not None else await self.names.first_name(uid)
+
+        def vote(db: Connection) -> Tuple[Optional[tuple], Optional[tuple], int]:
+            now = int(time())
+            voter = db.execute(
+                'UPDATE user SET last_vote = ? WHERE id = ? AND last_vote <= ? RETURNING *',
+                (now, from_id, now - timeout)
+            ).fetchone()
+            if voter is None:
+                last_vote = db.execute('SELECT last_vote FROM user WHERE id = ?', (from_id,)).fetchone()
+                return None, None, (last_vote[0] if last_vote else now) + timeout - now
+            target = db.execute(
+                'INSERT INTO user (id, nickname, count, last_vote) VALUES (?, ?, ?, 0) '
+                'ON CONFLICT (id) DO UPDATE SET count = count + excluded.count RETURNING *',
+                (uid, nickname, by)
+            ).fetchone()
+            if chat_id is not None:
+                db.execute(
+                    'INSERT INTO chat_karma (chat_id, user_id, count) VALUES (?, ?, ?) '
+                    'ON CONFLICT (chat_id, user_id) DO UPDATE SET count = count + excluded.count',
+                    (chat_id, uid, by)
+                )
+            db.execute(
+                'INSERT INTO vote (from_id, user_id, chat_id, value, created_at) VALUES (?, ?, ?, ?, ?)',
+                (from_id, uid, chat_id, by, now)
+            )
+            return voter, target, 0
+        voter, target, wait = await self.run(vote)
+        if voter is None:
+            return None, wait
+        self._user(voter)
+        return self._user(target), 0
 
-    def get_or_add_chat(self, chat_id: int) -> Chat:
+    async def get_or_add_chat(self, chat_id: int) -> Chat:
         """Get chat or create new if it not exists
 
         :param chat_id: unique chat ID
         :return: Chat data
         """
-        chat = self.cursor.execute('SELECT * FROM chat WHERE id = ?', (chat_id,)).fetchone()
-        if chat is None:
-            data = (chat_id, 0, '', '#212121', '#fefefe', '#cecece', '#98cd98')
-            self.cursor.execute(
+        chat = self.chats.get(chat_id)
+        if chat is not None:
+            return chat
+        row = self._read('SELECT * FROM chat WHERE id = ?', (chat_id,))
+        if row is None:
+            row = await self._write(
                 'INSERT INTO chat (id, group_id, title, tt_back, tt_fore, tt_teacher, tt_time) '
-                'VALUES (?, ?, ?, ?, ?, ?, ?)', data
+                'VALUES (?, 0, \'\', ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET id = id RETURNING *',
+                (chat_id, *DEFAULT_COLORS)
             )
-            self.db.commit()
-            chat = data
-        return Chat.from_tuple(chat)
+        return self._chat(row)
 
-    def get_or_add_pro(self, uid: int) -> ProCollege:
-        pro = self.cursor.execute('SELECT * FROM procollege WHERE id = ?', (uid,)).fetchone()
+    async def get_group_ids(self) -> List[int]:
+        """Returns unique IDs of groups set in chats"""
+        return [i[0] for i in self.cursor.execute(
+            "SELECT DISTINCT group_id FROM chat WHERE title != ''"
+        ).fetchall()]
+
+    async def get_chats(self) -> List[Chat]:
+        """Returns all chats"""
+        return [Chat.from_tuple(i) for i in self.cursor.execute('SELECT * FROM chat').fetchall()]
+
+    async def get_chat_ids(self) -> List[int]:
+        """Returns IDs of all chats"""
+        return [i[0] for i in self.cursor.execute('SELECT id FROM chat').fetchall()]
+
+    async def get_chats_by_group(self, group_id: int) -> List[Chat]:
+        """Returns chats with group
+
+        :param group_id: unique group ID
+        """
+        return [Chat.from_tuple(i) for i in self.cursor.execute(
+            'SELECT * FROM chat WHERE group_id = ? AND title != \'\'', (group_id,)
+        ).fetchall()]
+
+    async def get_or_add_pro(self, uid: int) -> ProCollege:
+        pro = self._read('SELECT * FROM procollege WHERE id = ?', (uid,))
         if pro is None:
-            data = (uid, '', '')
-            self.cursor.execute(
-                'INSERT INTO procollege(id, login, password) VALUES(?, ?, ?)', data
+            pro = await self._write(
+                'INSERT INTO procollege (id, login, password) VALUES (?, \'\', \'\') '
+                'ON CONFLICT (id) DO UPDATE SET id = id RETURNING *', (uid,)
             )
-            self.db.commit()
-            pro = data
         return ProCollege.from_tuple(pro)
 
-    def get_or_add_phrase_state(self, chat_id: int) -> PhraseState:
-        state = self.cursor.execute('SELECT * FROM phraseState WHERE id = ?', (chat_id,)).fetchone()
+    async def get_or_add_phrase_state(self, chat_id: int) -> PhraseState:
+        state = self._read('SELECT * FROM phraseState WHERE id = ?', (chat_id,))
         if state is None:
-            data = (chat_id, 0, "")
-            self.cursor.execute(
-                'INSERT INTO phraseState(id, state, phrases) VALUES(?, ?, ?)', data
+            state = await self._write(
+                'INSERT INTO phraseState (id, state, seq) VALUES (?, 0, 0) '
+                'ON CONFLICT (id) DO UPDATE SET id = id RETURNING *', (chat_id,)
             )
-            self.db.commit()
-            state = data
         return PhraseState.from_tuple(state)
 
-    def auth(self, uid: int, login: str, password: str):
-        pro = self.get_or_add_pro(uid)
-        self.cursor.execute('UPDATE procollege SET login = ?, password = ? WHERE id = ?', (login, password, uid))
-        self.db.commit()
+    async def auth(self, uid: int, login: str, password: str):
+        await self._write(
+            'INSERT INTO procollege (id, login, password) VALUES (?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET login = excluded.login, password = excluded.password',
+            (uid, login, password)
+        )
 
-    def change_chat_group(self, chat_id: int, group_id: int, title: str):
+    async def change_chat_group(self, chat_id: int, group_id: int, title: str):
         """Changes chat group
 
         :param chat_id: unique chat ID
         :param group_id: unique group ID
         :param title: group title
         """
-        chat = self.get_or_add_chat(chat_id)
-        self.cursor.execute(
-            'UPDATE chat SET title = ?, group_id = ? WHERE id = ?',
-            (title, group_id, chat_id)
-        )
-        self.db.commit()
+        self._chat(await self._write(
+            'INSERT INTO chat (id, group_id, title, tt_back, tt_fore, tt_teacher, tt_time) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET group_id = excluded.group_id, title = excluded.title RETURNING *',
+            (chat_id, group_id, title, *DEFAULT_COLORS)
+        ))
 
-    def inc_state(self, chat_id: int, text: str):
-        """Changes chat group
+    async def inc_state(self, chat_id: int, text: str) -> PhraseState:
+        """Stores message and increments chat messages counter
+
+        Message overwrites the oldest one in the chat ring, so cost does not depend on chat age.
 
         :param chat_id: unique chat ID
         :param text: message text
         """
-        state = self.get_or_add_phrase_state(chat_id)
-        state.state = state.state+1 if state.state+1 <= MESSAGE_STATE else 0
-        state.text += ' ' + text
-        self.cursor.execute(
-            'UPDATE phraseState SET state = ?, phrases = ? WHERE id = ?',
-            (state.state, state.text, chat_id)
+        def store(db: Connection) -> PhraseState:
+            now = int(time())
+            state = PhraseState.from_tuple(db.execute(
+                'INSERT INTO phraseState (id, state, seq) VALUES (?, 1, 1) '
+                'ON CONFLICT (id) DO UPDATE SET '
+                'state = CASE WHEN state + 1 <= ? THEN state + 1 ELSE 0 END, seq = seq + 1 RETURNING *',
+                (chat_id, MESSAGE_STATE)
+            ).fetchone())
+            slot = state.seq % self.phrases_size
+            state.removed = db.execute(
+                'SELECT seq, text FROM phrase WHERE chat_id = ? AND slot = ?', (chat_id, slot)
+            ).fetchall()
+            db.execute(
+                'INSERT INTO phrase (chat_id, slot, seq, text, created_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (chat_id, slot) DO UPDATE SET '
+                'seq = excluded.seq, text = excluded.text, created_at = excluded.created_at',
+                (chat_id, slot, state.seq, text, now)
+            )
+            if state.state == 0:
+                state.removed += db.execute(
+                    'DELETE FROM phrase WHERE chat_id = ? AND created_at < ? RETURNING seq, text',
+                    (chat_id, now - self.phrases_age)
+                ).fetchall()
+            return state
+        return await self.run(store)
+
+    async def get_phrases(self, chat_id: int, since: int = 0) -> List[Tuple[int, str]]:
+        """Returns stored chat messages with their sequence numbers from oldest to newest
+
+        :param chat_id: unique chat ID
+        :param since: returns only messages after this sequence number
+        """
+        return self.cursor.execute(
+            'SELECT seq, text FROM phrase WHERE chat_id = ? AND seq > ? ORDER BY seq', (chat_id, since)
+        ).fetchall()
+
+    async def get_markov(self, chat_id: int) -> Optional[Tuple[int, bytes]]:
+        """Returns sequence number of the last learned message and serialized chain
+
+        :param chat_id: unique chat ID
+        """
+        return self._read('SELECT seq, model FROM markov WHERE chat_id = ?', (chat_id,))
+
+    async def save_markov(self, chat_id: int, seq: int, model: bytes) -> NoReturn:
+        """Saves serialized chain
+
+        :param chat_id: unique chat ID
+        :param seq: sequence number of the last learned message
+        :param model: serialized chain
+        """
+        await self._write(
+            'INSERT INTO markov (chat_id, seq, model) VALUES (?, ?, ?) '
+            'ON CONFLICT (chat_id) DO UPDATE SET seq = excluded.seq, model = excluded.model',
+            (chat_id, seq, model)
         )
-        self.db.commit()
-        return state
 
-    def change_chat_tt(
+    async def create_broadcast(self, text: str, admin_id: int, total: int, batches: List[str]) -> int:
+        """Saves new broadcast with pending batches
+
+        :param text: message text
+        :param admin_id: user ID who started broadcast
+        :param total: count of recipients
+        :param batches: comma separated peer IDs of each batch
+        :return: broadcast ID
+        """
+        def create(db: Connection) -> int:
+            broadcast_id = db.execute(
+                'INSERT INTO broadcast (text, admin_id, total, created_at) VALUES (?, ?, ?, ?) RETURNING id',
+                (text, admin_id, total, int(time()))
+            ).fetchone()[0]
+            db.executemany(
+                'INSERT INTO broadcast_batch (broadcast_id, batch, peers) VALUES (?, ?, ?)',
+                [(broadcast_id, i, peers) for i, peers in enumerate(batches)]
+            )
+            return broadcast_id
+        return await self.run(create)
+
+    async def get_unfinished_broadcasts(self) -> List[Tuple[int, str, int]]:
+        """Returns ID, text and admin ID of interrupted broadcasts"""
+        return self.cursor.execute(
+            'SELECT id, text, admin_id FROM broadcast WHERE finished_at IS NULL ORDER BY id'
+        ).fetchall()
+
+    async def get_broadcast_batches(self, broadcast_id: int) -> List[Tuple[int, str]]:
+        """Returns number and peers of pending batches
+
+        :param broadcast_id: broadcast ID
+        """
+        return self.cursor.execute(
+            'SELECT batch, peers FROM broadcast_batch WHERE broadcast_id = ? AND status = 0 ORDER BY batch',
+            (broadcast_id,)
+        ).fetchall()
+
+    async def finish_batch(self, broadcast_id: int, batch: int, sent: bool, delivered: int, failed: int) -> NoReturn:
+        """Saves batch result
+
+        :param broadcast_id: broadcast ID
+        :param batch: batch number
+        :param sent: False when batch was not sent at all
+        :param delivered: count of delivered messages
+        :param failed: count of not delivered messages
+        """
+        await self._write(
+            'UPDATE broadcast_batch SET status = ?, delivered = ?, failed = ? WHERE broadcast_id = ? AND batch = ?',
+            (1 if sent else 2, delivered, failed, broadcast_id, batch)
+        )
+
+    async def finish_broadcast(self, broadcast_id: int) -> Tuple[int, int, int]:
+        """Marks broadcast finished
+
+        :param broadcast_id: broadcast ID
+        :return: count of recipients, delivered and not delivered messages
+        """
+        def finish(db: Connection) -> Tuple[int, int, int]:
+            db.execute('UPDATE broadcast SET finished_at = ? WHERE id = ?', (int(time()), broadcast_id))
+            return db.execute(
+                'SELECT total, '
+                'IFNULL((SELECT SUM(delivered) FROM broadcast_batch WHERE broadcast_id = broadcast.id), 0), '
+                'IFNULL((SELECT SUM(failed) FROM broadcast_batch WHERE broadcast_id = broadcast.id), 0) '
+                'FROM broadcast WHERE id = ?', (broadcast_id,)
+            ).fetchone()
+        return await self.run(finish)
+
+    async def change_chat_tt(
             self,
             chat_id: int,
             color_name: Literal['tt_fore', 'tt_back', 'tt_teacher', 'tt_time'],
@@ -180,35 +430,28 @@ class DB:
         :param color_name: color name
         :param color: HEX color
         """
-        chat = self.get_or_add_chat(chat_id)
-        self.cursor.execute(
-            f'UPDATE chat SET {color_name} = ? WHERE id = ?',
-            (color, chat_id)
-        )
-        self.db.commit()
+        if color_name not in COLOR_COLUMNS:
+            raise ValueError(f'unknown color {color_name!r}')
+        colors = dict(zip(COLOR_COLUMNS, DEFAULT_COLORS), **{color_name: color})
+        self._chat(await self._write(
+            'INSERT INTO chat (id, group_id, title, tt_back, tt_fore, tt_teacher, tt_time) '
+            'VALUES (?, 0, \'\', ?, ?, ?, ?) '
+            f'ON CONFLICT (id) DO UPDATE SET {color_name} = excluded.{color_name} RETURNING *',
+            (chat_id, *colors.values())
+        ))
 
-    def change_chat_tt_fore(self, chat_id: int, color: str):
+    async def change_chat_tt_fore(self, chat_id: int, color: str):
         """Changes chat timetable foreground
 
         :param chat_id: unique chat ID
         :param color: foreground color
         """
-        chat = self.get_or_add_chat(chat_id)
-        self.cursor.execute(
-            'UPDATE chat SET tt_fore = ? WHERE id = ?',
-            (color, chat_id)
-        )
-        self.db.commit()
+        await self.change_chat_tt(chat_id, 'tt_fore', color)
 
-    def change_chat_tt_back(self, chat_id: int, color: str):
+    async def change_chat_tt_back(self, chat_id: int, color: str):
         """Changes chat timetable background
 
         :param chat_id: unique chat ID
         :param color: background color
         """
-        chat = self.get_or_add_chat(chat_id)
-        self.cursor.execute(
-            'UPDATE chat SET tt_back = ? WHERE id = ?',
-            (color, chat_id)
-        )
-        self.db.commit()
\ No newline at end of file
+        await self.change_chat_tt(chat_id, 'tt_back', color)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Provides RecordCache class"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NoReturn, Optional
+
+
+class RecordCache:
+    """LRU cache of database records
+
+    DB puts every record it reads or writes, so cached records are never older than the database.
+    """
+    def __init__(self, max_size: int = 4096):
+        """Initializes empty cache
+
+        :param max_size: maximum of records
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns cached record
+
+        :param key: record ID
+        """
+        record = self._data.get(key)
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return record
+
+    def put(self, key: Hashable, record: Any) -> NoReturn:
+        """Caches record
+
+        :param key: record ID
+        :param record: record
+        """
+        self._data[key] = record
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns size and hit/miss counters"""
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
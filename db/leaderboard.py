@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Provides Leaderboard class"""
+from typing import Dict, List, NoReturn, Optional
+
+from .types import User
+
+
+class Leaderboard:
+    """Top and bottom users by count, updated incrementally
+
+    Board is dropped and loaded from the database again only when a member
+    becomes its last one, because a user outside could outrank it then.
+    """
+    def __init__(self, size: int = 10):
+        """
+        :param size: count of users in each board
+        """
+        self.size = size
+        self.loads = 0
+        self._boards: Dict[bool, Optional[List[User]]] = {False: None, True: None}
+
+    def get(self, limit: int, reverse: bool = False) -> Optional[List[User]]:
+        """Returns cached board or None, if it must be loaded
+
+        :param limit: count of users
+        :param reverse: bottom board instead of top one
+        """
+        board = self._boards[reverse]
+        if board is None or limit > self.size:
+            return None
+        return board[:limit]
+
+    def load(self, users: List[User], reverse: bool = False) -> NoReturn:
+        """Caches board loaded from the database
+
+        :param users: first `size` users ordered by count
+        :param reverse: bottom board instead of top one
+        """
+        self.loads += 1
+        self._boards[reverse] = users[:self.size]
+
+    def update(self, user: User) -> NoReturn:
+        """Puts changed user into boards
+
+        :param user: user with actual count
+        """
+        for reverse, board in self._boards.items():
+            if board is None:
+                continue
+            key = (lambda u: u.count) if reverse else (lambda u: -u.count)
+            members = [i for i in board if i.uid != user.uid]
+            was_member = len(members) != len(board)
+            full = len(board) >= self.size
+            if not was_member and full and key(user) >= key(board[-1]):
+                continue
+            members.append(user)
+            members.sort(key=key)
+            if was_member and full and members[-1] is user:
+                self._boards[reverse] = None
+                continue
+            self._boards[reverse] = members[:self.size]
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Provides versioned database schema migrations
+
+Applied version is stored in `PRAGMA user_version`, every migration runs in
+its own transaction.
+"""
+from sqlite3 import Connection
+from typing import List
+
+
+MIGRATIONS: List[str] = [
+    # 1: initial schema
+    '''
+    CREATE TABLE IF NOT EXISTS chat (
+        id INTEGER NOT NULL,  -- chat unique ID
+        group_id INTEGER NOT NULL,  -- group unique ID
+        title TEXT NOT NULL,  -- group title
+        tt_back TEXT NOT NULL,  -- timetable background
+        tt_fore TEXT NOT NULL,  -- timetable foreground
+        tt_teacher TEXT NOT NULL, -- timetable teacher foreground
+        tt_time TEXT NOT NULL  -- timetable time foreground
+    );
+    CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,  -- user ID,
+        nickname TEXT NOT NULL,  -- user nickname
+        count INTEGER NOT NULL,  -- user count
+        last_vote INTEGER NOT NULL  -- last user vote time
+    );
+    CREATE TABLE IF NOT EXISTS procollege (
+        id INTEGER NOT NULL,  -- user ID
+        login TEXT NOT NULL,  -- user login
+        password TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS phraseState (
+        id INTEGER NOT NULL, -- chat ID
+        state INTEGER NOT NULL,  -- current state
+        phrases TEXT NOT NULL -- all phrases
+    );
+    ''',
+    # 2: primary keys instead of duplicated rows, the last inserted row is kept
+    '''
+    CREATE TABLE chat_new (
+        id INTEGER PRIMARY KEY,  -- chat unique ID
+        group_id INTEGER NOT NULL,  -- group unique ID
+        title TEXT NOT NULL,  -- group title
+        tt_back TEXT NOT NULL,  -- timetable background
+        tt_fore TEXT NOT NULL,  -- timetable foreground
+        tt_teacher TEXT NOT NULL, -- timetable teacher foreground
+        tt_time TEXT NOT NULL  -- timetable time foreground
+    );
+    INSERT INTO chat_new SELECT * FROM chat WHERE rowid IN (SELECT MAX(rowid) FROM chat GROUP BY id);
+    DROP TABLE chat;
+    ALTER TABLE chat_new RENAME TO chat;
+    CREATE INDEX chat_group_id ON chat (group_id);
+
+    CREATE TABLE user_new (
+        id INTEGER PRIMARY KEY,  -- user ID,
+        nickname TEXT NOT NULL,  -- user nickname
+        count INTEGER NOT NULL,  -- user count
+        last_vote INTEGER NOT NULL  -- last user vote time
+    );
+    INSERT INTO user_new SELECT * FROM user WHERE rowid IN (SELECT MAX(rowid) FROM user GROUP BY id);
+    DROP TABLE user;
+    ALTER TABLE user_new RENAME TO user;
+
+    CREATE TABLE procollege_new (
+        id INTEGER PRIMARY KEY,  -- user ID
+        login TEXT NOT NULL,  -- user login
+        password TEXT NOT NULL
+    );
+    INSERT INTO procollege_new SELECT * FROM procollege
+        WHERE rowid IN (SELECT MAX(rowid) FROM procollege GROUP BY id);
+    DROP TABLE procollege;
+    ALTER TABLE procollege_new RENAME TO procollege;
+
+    CREATE TABLE phraseState_new (
+        id INTEGER PRIMARY KEY, -- chat ID
+        state INTEGER NOT NULL,  -- current state
+        phrases TEXT NOT NULL -- all phrases
+    );
+    INSERT INTO phraseState_new SELECT * FROM phraseState
+        WHERE rowid IN (SELECT MAX(rowid) FROM phraseState GROUP BY id);
+    DROP TABLE phraseState;
+    ALTER TABLE phraseState_new RENAME TO phraseState;
+    ''',
+    # 3: phrases are kept in a per-chat ring instead of one growing column
+    '''
+    CREATE TABLE phrase (
+        chat_id INTEGER NOT NULL,  -- chat ID
+        slot INTEGER NOT NULL,  -- ring position, message sequence number modulo ring size
+        seq INTEGER NOT NULL,  -- message sequence number
+        text TEXT NOT NULL,  -- message text
+        created_at INTEGER NOT NULL,  -- message time
+        PRIMARY KEY (chat_id, slot)
+    ) WITHOUT ROWID;
+    INSERT INTO phrase SELECT id, 1, 1, phrases, CAST(strftime('%s', 'now') AS INTEGER)
+        FROM phraseState WHERE phrases != '';
+    ALTER TABLE phraseState ADD COLUMN seq INTEGER NOT NULL DEFAULT 0;  -- count of stored messages
+    UPDATE phraseState SET seq = 1 WHERE phrases != '';
+    ALTER TABLE phraseState DROP COLUMN phrases;
+    ''',
+    # 4: learned markov chains of chats
+    '''
+    CREATE TABLE markov (
+        chat_id INTEGER PRIMARY KEY,  -- chat ID
+        seq INTEGER NOT NULL,  -- sequence number of the last learned message
+        model BLOB NOT NULL  -- compressed chain
+    );
+    ''',
+    # 5: leaderboards
+    '''
+    CREATE INDEX user_count ON user (count);
+    CREATE TABLE chat_karma (
+        chat_id INTEGER NOT NULL,  -- chat ID
+        user_id INTEGER NOT NULL,  -- user ID
+        count INTEGER NOT NULL,  -- user count in chat
+        PRIMARY KEY (chat_id, user_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX chat_karma_count ON chat_karma (chat_id, count);
+    ''',
+    # 6: votes ledger
+    '''
+    CREATE TABLE vote (
+        id INTEGER PRIMARY KEY,
+        from_id INTEGER NOT NULL,  -- user ID who voted
+        user_id INTEGER NOT NULL,  -- user ID
+        chat_id INTEGER,  -- chat ID, NULL for private messages
+        value INTEGER NOT NULL,  -- count change
+        created_at INTEGER NOT NULL  -- vote time
+    );
+    CREATE INDEX vote_user_id ON vote (user_id);
+    ''',
+    # 7: broadcasts progress
+    '''
+    CREATE TABLE broadcast (
+        id INTEGER PRIMARY KEY,
+        text TEXT NOT NULL,  -- message text
+        admin_id INTEGER NOT NULL,  -- user ID who started broadcast
+        total INTEGER NOT NULL,  -- count of recipients
+        created_at INTEGER NOT NULL,  -- start time
+        finished_at INTEGER  -- finish time, NULL while sending
+    );
+    CREATE TABLE broadcast_batch (
+        broadcast_id INTEGER NOT NULL,  -- broadcast ID
+        batch INTEGER NOT NULL,  -- batch number
+        peers TEXT NOT NULL,  -- comma separated peer IDs
+        status INTEGER NOT NULL DEFAULT 0,  -- 0 - pending, 1 - sent, 2 - failed
+        delivered INTEGER NOT NULL DEFAULT 0,  -- count of delivered messages
+        failed INTEGER NOT NULL DEFAULT 0,  -- count of not delivered messages
+        PRIMARY KEY (broadcast_id, batch)
+    ) WITHOUT ROWID;
+    ''',
+]
+
+
+def migrate(db: Connection) -> int:
+    """Applies migrations that are not applied yet
+
+    :param db: database connection
+    :return: schema version
+    """
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    for i, script in enumerate(MIGRATIONS[version:], version + 1):
+        try:
+            db.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {i};\nCOMMIT;')
+        except Exception:
+            db.rollback()
+            raise
+    return len(MIGRATIONS)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Provides NameResolver class"""
+from asyncio import Future, Task, create_task, get_running_loop, sleep
+from typing import Dict, NoReturn, Set
+
+from vkbottle import API
+
+
+class NameResolver:
+    """Resolves user first names with batched users.get calls
+
+    Names requested within `window` seconds are fetched together, up to
+    `batch_size` user IDs per call.
+    """
+    def __init__(self, api: API, window: float = 0.05, batch_size: int = 1000):
+        """
+        :param api: VK API
+        :param window: seconds to collect user IDs
+        :param batch_size: maximum of user IDs in one call
+        """
+        self.api = api
+        self.window = window
+        self.batch_size = batch_size
+        self.calls = 0
+        self._pending: Dict[int, Future] = {}
+        self._flushing = False
+        self._tasks: Set[Task] = set()
+
+    async def first_name(self, uid: int) -> str:
+        """Returns user first name
+
+        :param uid: user ID
+        """
+        future = self._pending.get(uid)
+        if future is None:
+            future = get_running_loop().create_future()
+            self._pending[uid] = future
+            if not self._flushing:
+                self._flushing = True
+                # Keeps reference to flush task until it is done
+                task = create_task(self._flush())
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return await future
+
+    async def _flush(self) -> NoReturn:
+        await sleep(self.window)
+        self._flushing = False
+        pending, self._pending = self._pending, {}
+        uids = list(pending)
+        for i in range(0, len(uids), self.batch_size):
+            batch = uids[i:i + self.batch_size]
+            self.calls += 1
+            try:
+                users = {user.id: user.first_name for user in await self.api.users.get(user_ids=batch)}
+            except Exception as e:
+                for uid in batch:
+                    if not pending[uid].done():
+                        pending[uid].set_exception(e)
+                continue
+            for uid in batch:
+                if not pending[uid].done():
+                    pending[uid].set_result(users.get(uid, f'id{uid}'))
+
+    def stats(self) -> Dict[str, int]:
+        """Returns count of users.get calls"""
+        return {'calls': self.calls, 'pending': len(self._pending)}
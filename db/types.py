@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from typing import Tuple
+from typing import List, Tuple
 
 
 class Chat:
@@ -72,15 +72,16 @@ class ProCollege:
 
 class PhraseState:
     @staticmethod
-    def from_tuple(data: Tuple[int, int, str]) -> 'PhraseState':
+    def from_tuple(data: Tuple[int, int, int]) -> 'PhraseState':
         return PhraseState(*data)
 
     def __init__(
             self,
             chat_id: int,
             state: int,
-            text: str
+            seq: int
     ):
         self.chat_id = chat_id
         self.state = state
-        self.text = text
+        self.seq = seq
+        self.removed: List[Tuple[int, str]] = []  # (seq, text) of messages evicted by the last stored one
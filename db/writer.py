@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Provides Writer class"""
+from asyncio import AbstractEventLoop, Future, get_running_loop
+from queue import Queue, Empty
+from sqlite3 import Connection, connect
+from threading import Thread
+from time import monotonic
+from typing import Any, Callable, Dict, List, NoReturn, Optional, Tuple
+
+
+Job = Tuple[Callable[[Connection], Any], Future, AbstractEventLoop]
+
+
+class Writer:
+    """Owns the only writing connection and group-commits queued jobs
+
+    Jobs that arrive within `window` seconds (or until `batch_size` jobs are
+    collected) share one transaction and one commit. Every job runs in its own
+    savepoint, so a failing job is rolled back without affecting the others.
+    Job futures are resolved only after the commit.
+    """
+    def __init__(self, path: str, window: float = 0.05, batch_size: int = 256):
+        """Opens connection and starts writer thread
+
+        :param path: database path
+        :param window: seconds to wait for more jobs before commit
+        :param batch_size: maximum of jobs in one commit
+        """
+        self.window = window
+        self.batch_size = batch_size
+        self.jobs = 0
+        self.commits = 0
+        self.failed = 0
+        self._queue: 'Queue[Optional[Job]]' = Queue()
+        self._db = connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA synchronous = NORMAL')
+        self._thread = Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, job: Callable[[Connection], Any]) -> Future:
+        """Queues job, its statements are committed in one transaction
+
+        :param job: function that receives writing connection
+        :return: future with job result, resolved after commit
+        """
+        loop = get_running_loop()
+        future = loop.create_future()
+        self._queue.put((job, future, loop))
+        return future
+
+    def close(self) -> NoReturn:
+        """Commits queued jobs and stops writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns jobs and commits counters"""
+        return {
+            'jobs': self.jobs,
+            'commits': self.commits,
+            'failed': self.failed,
+            'queued': self._queue.qsize(),
+        }
+
+    def _run(self) -> NoReturn:
+        running = True
+        while running:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = monotonic() + self.window
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get(timeout=max(deadline - monotonic(), 0))
+                except Empty:
+                    break
+                if job is None:
+                    running = False
+                    break
+                batch.append(job)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Job]) -> NoReturn:
+        results = []
+        try:
+            self._db.execute('BEGIN IMMEDIATE')
+            for job, future, loop in batch:
+                self._db.execute('SAVEPOINT job')
+                try:
+                    results.append((future, loop, job(self._db), None))
+                    self._db.execute('RELEASE job')
+                except Exception as e:
+                    self._db.execute('ROLLBACK TO job')
+                    self._db.execute('RELEASE job')
+                    results.append((future, loop, None, e))
+            self._db.execute('COMMIT')
+        except Exception as e:
+            if self._db.in_transaction:
+                self._db.execute('ROLLBACK')
+            print(f"Failed to commit {len(batch)} database jobs: {e!r}")
+            results = [(future, loop, None, e) for _, future, loop in batch]
+        self.jobs += len(batch)
+        self.commits += 1
+        for future, loop, result, error in results:
+            self.failed += error is not None
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                # Loop is already closed, nobody waits for the result
+                pass
+
+
+def _resolve(future: Future, result: Any, error: Optional[Exception]) -> NoReturn:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
-import os
+from io import BytesIO
+from collections import OrderedDict
 from random import choice
 from typing import Dict, Any, List, NoReturn, Optional, Union, Tuple
-from textwrap import wrap
 from threading import Thread
 
 from PIL import Image, ImageDraw, ImageFont
@@ -13,6 +13,11 @@ from vk_api.upload import VkUpload
 from vk_api.vk_api import VkApiGroup
 from ktc_api.types import Grade
 
+from .cache import RenderCache
+from .layout import Layout
+from .metrics import text_length, text_bbox, multiline_text_bbox, wrapped, stats as metrics_stats
+from .sprites import SpriteCache
+
 
 class Img:
     """Provides working with pillow"""
@@ -25,7 +30,15 @@ class Img:
             sm_size: int = 16,
             xxxl_size: int = 64,
             xxl_size: int = 42,
-            dm_data: Optional[List[Union[str, Tuple[str, str]]]] = None
+            dm_data: Optional[List[Union[str, Tuple[str, str]]]] = None,
+            image_format: str = 'PNG',
+            palette: bool = True,
+            palette_colors: int = 64,
+            optimize: bool = False,
+            compress_level: int = 6,
+            quality: int = 90,
+            layouts_size: int = 64,
+            sprites_size: int = 1024
     ):
         """Initializes class and creates fonts
 
@@ -37,6 +50,14 @@ class Img:
         :param xxxl_size: extra large text size
         :param xxl_size: large text size
         :param dm_data: data for dm
+        :param image_format: output format (PNG, JPEG, WEBP)
+        :param palette: encode flat images (timetables, grades) as palette PNG
+        :param palette_colors: palette size of flat images
+        :param optimize: spend more time on encoding to get smaller files
+        :param compress_level: PNG compression level (0-9)
+        :param quality: JPEG/WEBP quality (1-100)
+        :param layouts_size: maximum of cached theme-independent timetable layouts
+        :param sprites_size: maximum of cached pre-rasterized texts
         """
         def ttf(size):
             return ImageFont.truetype(font_path, size, encoding=encoding)
@@ -47,28 +68,49 @@ class Img:
         self.dm_title_font = ttf(xxxl_size)
         self.dm_font = ttf(xxl_size)
         self.dm_data = dm_data
+        self.image_format = image_format
+        self.palette = palette
+        self.palette_colors = palette_colors
+        self.optimize = optimize
+        self.compress_level = compress_level
+        self.quality = quality
+        self.layouts_size = layouts_size
+        self.layouts: 'OrderedDict[str, Image.Image]' = OrderedDict()
+        self.sprites = SpriteCache(sprites_size)
+        self.warm_sprites()
+
+    def warm_sprites(self) -> NoReturn:
+        """Rasterizes texts drawn in almost every timetable and grades image"""
+        days = ('Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота')
+        self.sprites.warm([(str(i), self.title_font) for i in range(1, 9)])
+        self.sprites.warm([(i, self.font) for i in days])
+        self.sprites.warm([(i, self.title_font) for i in days])
+        self.sprites.warm([(i, self.title_font) for i in ('Предмет', 'Оценки', 'Пропуски (часы)')])
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns render caches counters"""
+        return {
+            'layouts': len(self.layouts),
+            'sprites': self.sprites.stats(),
+            'metrics': metrics_stats(),
+        }
 
     def _draw_days(
             self,
             days: List[Dict[str, Any]],
-            draw: ImageDraw,
+            layout: Layout,
             w: int,
-            y_offset: int,
-            foreground: str,
-            teacher: str,
-            time: str
+            y_offset: int
     ) -> int:
         """Draws list of days
 
         :param days: days data
-        :param draw: ImageDraw instance
+        :param layout: Layout instance
         :param w: day width
         :param y_offset: y offset
-        :param foreground: foreground color
-        :param teacher: teacher color
-        :param time: time color
         :return: maximum y from days
         """
+        foreground = layout.draw['foreground']
         offset = 0
         w3 = w / 3
         max_y = y_offset
@@ -76,41 +118,43 @@ class Img:
         for day in days:
             y = y_offset
             # Draw day title
-            length = draw.textlength(day['title'], self.font)
-            draw.text((w3 / 2 - length / 2 + offset, y), day['title'], foreground, self.font)
+            length = text_length(day['title'], self.font)
+            self.sprites.text(
+                layout.masks['foreground'], (w3 / 2 - length / 2 + offset, y), day['title'], 255, self.font
+            )
 
             y += 32
             for lesson in day['lessons']:
                 # Draw lesson <hr>
-                draw.line([(offset + 8, y), (offset + w3 - 8, y)], foreground, 1)
+                foreground.line([(offset + 8, y), (offset + w3 - 8, y)], 255, 1)
                 y += 4
                 # Draw lesson time
                 # Lesson number
-                x = offset + draw.textlength(lesson['time'][0], self.title_font)
-                draw.text((offset + 4, y + 8), lesson['time'][0], time, self.title_font)
+                x = offset + text_length(lesson['time'][0], self.title_font)
+                self.sprites.text(layout.masks['time'], (offset + 4, y + 8), lesson['time'][0], 255, self.title_font)
                 # Lesson time from and time to
                 x += 16
-                draw.multiline_text(
-                    (x, y), lesson['time'][1] + '\n' + lesson['time'][2],
-                    time, self.font_mini
+                self.sprites.multiline_text(
+                    layout.masks['time'], (x, y), lesson['time'][1] + '\n' + lesson['time'][2],
+                    255, self.font_mini
                 )
                 # Draw lesson title
-                lesson_title = '\n'.join(wrap(lesson['title'], 22))
+                lesson_title = wrapped(lesson['title'], 22)
                 title_font = self.font_mini
-                _, _, _w, _h = draw.multiline_textbbox((0, 0), lesson['time'][1], self.font_mini)
+                _, _, _w, _h = multiline_text_bbox(lesson['time'][1], self.font_mini)
                 x += _w
-                _, _, _w, _h = draw.multiline_textbbox((0, 0), lesson_title, self.font_mini)
+                _, _, _w, _h = multiline_text_bbox(lesson_title, self.font_mini)
                 if _h == 0:
                     _h = 32
-                draw.multiline_text(
+                foreground.multiline_text(
                     ((x + ((w3 - (x - offset)) / 2 - _w / 2)), y),
-                    lesson_title, foreground, title_font, align='center')
+                    lesson_title, 255, title_font, align='center')
                 # Draw lesson teacher and classroom
                 teacher_classroom = lesson['teacher'] + ', ' + lesson['classroom']
-                length = draw.textlength(teacher_classroom, self.small_font)
-                draw.text(
-                    ((w3 - length + offset - 8), y + _h),
-                    teacher_classroom, teacher, self.small_font
+                length = text_length(teacher_classroom, self.small_font)
+                self.sprites.text(
+                    layout.masks['teacher'], ((w3 - length + offset - 8), y + _h),
+                    teacher_classroom, 255, self.small_font
                 )
                 y += _h + 36
                 if max_y < y:
@@ -118,131 +162,202 @@ class Img:
             offset += w3
         return max_y
 
+    def _lesson_height(self, lesson: Dict[str, Any]) -> int:
+        """Returns height of lesson drawn in day"""
+        _, _, _, h = multiline_text_bbox(wrapped(lesson['title'], 22), self.font_mini)
+        return 4 + (h or 32) + 36
+
+    def _days_height(self, days: List[Dict[str, Any]]) -> int:
+        """Returns height of the highest day drawn by `_draw_days`"""
+        return max(
+            (32 + sum(self._lesson_height(i) for i in day['lessons']) for day in days if day['lessons']),
+            default=0
+        )
+
+    @staticmethod
+    def _encode(img: Image.Image, image_format: str = 'PNG', **params) -> bytes:
+        """Encodes image into memory
+
+        :param img: image
+        :param image_format: image format
+        :param params: encoder parameters
+        :return: encoded image
+        """
+        buffer = BytesIO()
+        img.save(buffer, image_format, **params)
+        return buffer.getvalue()
+
+    def _save(self, img: Image.Image, flat: bool = True) -> bytes:
+        """Encodes image with configured format
+
+        Alpha channel is dropped, VK does not keep it anyway.
+
+        :param img: image
+        :param flat: image has a few flat colors and may be palette encoded
+        :return: encoded image
+        """
+        if not (flat and self.palette and self.image_format == 'PNG'):
+            img = img.convert('RGB')
+        elif img.mode != 'P':
+            img = img.convert('RGB').quantize(self.palette_colors)
+        return Img._encode(
+            img, self.image_format,
+            optimize=self.optimize, compress_level=self.compress_level, quality=self.quality
+        )
+
+    def _layout(self, kind: str, data: Dict[str, Any], build) -> Image.Image:
+        """Returns cached theme-independent layout or builds it
+
+        :param kind: image kind
+        :param data: drawn data
+        :param build: function that builds palette-indexed image from data
+        """
+        key = RenderCache.key(kind, data)
+        layout = self.layouts.get(key)
+        if layout is None:
+            layout = build(data)
+            self.layouts[key] = layout
+            while len(self.layouts) > self.layouts_size:
+                self.layouts.popitem(last=False)
+        else:
+            self.layouts.move_to_end(key)
+        return layout
+
     def from_day(
             self,
-            name: str,
             day: Dict[str, Any],
             background: str,
             foreground: str,
             teacher: str,
             time: str
-    ) -> NoReturn:
+    ) -> bytes:
         """Creates an image from day
 
-        :param name: file name
         :param day: day data
         :param background: background color
         :param foreground: foreground color
         :param teacher: teacher color
         :param time: time color
         """
-        w, h = 512, 600
+        layout = self._layout('day', day, self._day_layout)
+        return self._save(Layout.recolor(layout, background, foreground, teacher, time))
+
+    def _day_layout(self, day: Dict[str, Any]) -> Image.Image:
+        """Draws day layout
+
+        :param day: day data
+        """
+        _, _, width, height = text_bbox(day['title'], self.title_font)
+        w = 512
+        h = 16 + height + 32 + sum(self._lesson_height(i) for i in day['lessons']) + 16
         y = 16
-        img = Image.new('RGBA', (w, h), background)
-        draw = ImageDraw.Draw(img, 'RGBA')
+        layout = Layout((w, h))
+        foreground = layout.draw['foreground']
 
         # Draw day title
-        _, _, width, height = draw.textbbox((0, 0), day['title'], self.title_font)
-        draw.text((w/2 - width/2, y), day['title'], foreground, self.title_font)
+        self.sprites.text(layout.masks['foreground'], (w/2 - width/2, y), day['title'], 255, self.title_font)
         y += height + 32
 
         # Draw lessons
         for lesson in day['lessons']:
             # Draw lesson <hr>
-            draw.line([(8, y), (w - 8, y)], foreground, 1)
+            foreground.line([(8, y), (w - 8, y)], 255, 1)
             y += 4
             # Draw lesson time
             # Lesson number
-            x = draw.textlength(lesson['time'][0], self.title_font)
-            draw.text((4, y + 8), lesson['time'][0], time, self.title_font)
+            x = text_length(lesson['time'][0], self.title_font)
+            self.sprites.text(layout.masks['time'], (4, y + 8), lesson['time'][0], 255, self.title_font)
             # Lesson time from and time to
             x += 16
-            draw.multiline_text(
-                (x, y), lesson['time'][1] + '\n' + lesson['time'][2],
-                time, self.font_mini
+            self.sprites.multiline_text(
+                layout.masks['time'], (x, y), lesson['time'][1] + '\n' + lesson['time'][2],
+                255, self.font_mini
             )
             # Draw lesson title
-            lesson_title = '\n'.join(wrap(lesson['title'], 22))
+            lesson_title = wrapped(lesson['title'], 22)
             title_font = self.font_mini
-            _, _, _w, _h = draw.multiline_textbbox((0, 0), lesson['time'][1], self.font_mini)
+            _, _, _w, _h = multiline_text_bbox(lesson['time'][1], self.font_mini)
             x += _w
-            _, _, _w, _h = draw.multiline_textbbox((0, 0), lesson_title, self.font_mini)
+            _, _, _w, _h = multiline_text_bbox(lesson_title, self.font_mini)
             if _h == 0:
                 _h = 32
-            draw.multiline_text(
+            foreground.multiline_text(
                 ((x + ((w - x) / 2 - _w / 2)), y),
-                lesson_title, foreground, title_font, align='center')
+                lesson_title, 255, title_font, align='center')
             # Draw lesson teacher and classroom
             teacher_classroom = lesson['teacher'] + ', ' + lesson['classroom']
-            length = draw.textlength(teacher_classroom, self.small_font)
-            draw.text(
-                ((w - length - 8), y + _h),
-                teacher_classroom, teacher, self.small_font
+            length = text_length(teacher_classroom, self.small_font)
+            self.sprites.text(
+                layout.masks['teacher'], ((w - length - 8), y + _h),
+                teacher_classroom, 255, self.small_font
             )
             y += _h + 36
 
-        # Save and clear
-        img.save(name)
-        del img
-        del draw
+        return layout.to_palette()
 
     def from_timetable(
             self,
-            name: str,
             timetable: Dict[str, Any],
             background: str,
             foreground: str,
             teacher: str,
             time: str
-    ) -> NoReturn:
+    ) -> bytes:
         """Creates an image from timetable
 
-        :param name: file name
         :param timetable: timetable data
         :param background: background color
         :param foreground: foreground color
         :param teacher: teacher color
         :param time: time color
         """
-        w, h = 1388, 1024
+        layout = self._layout('week', timetable, self._timetable_layout)
+        return self._save(Layout.recolor(layout, background, foreground, teacher, time))
+
+    def _timetable_layout(self, timetable: Dict[str, Any]) -> Image.Image:
+        """Draws timetable layout
+
+        :param timetable: timetable data
+        """
+        # Measure rows of days before allocating canvas
+        w = 1388
         y = 32
-        img = Image.new('RGBA', (w, h), background)
-        draw = ImageDraw.Draw(img, 'RGBA')
+        h = y + 96 + self._days_height(timetable['days'][:3]) + 32 + self._days_height(timetable['days'][3:]) + 32
+        layout = Layout((w, h))
 
         # Draw week title
         week_title = f'{timetable["week_number"]} неделя'
-        length = draw.textlength(week_title, self.title_font)
-        draw.text((w / 2 - length / 2, y), week_title, foreground, self.title_font)
+        length = text_length(week_title, self.title_font)
+        self.sprites.text(layout.masks['foreground'], (w / 2 - length / 2, y), week_title, 255, self.title_font)
 
         # Draw week days
         y += 96  # offset from week title
-        max_y = self._draw_days(timetable['days'][:3], draw, w, y, foreground, teacher, time)
+        max_y = self._draw_days(timetable['days'][:3], layout, w, y)
         y = max_y + 32
-        self._draw_days(timetable['days'][3:], draw, w, y, foreground, teacher, time)
+        self._draw_days(timetable['days'][3:], layout, w, y)
 
-        # Save and clear
-        img.save(name)
-        del img
-        del draw
+        return layout.to_palette()
 
     def create_dm(
             self,
-            images: List[str],
+            images: List[bytes],
             title: Optional[str] = '',
             text: Optional[str] = ''
-    ) -> NoReturn:
-        """Creates dm image
+    ) -> List[bytes]:
+        """Creates dm images
 
-        :param images: list of image paths
+        :param images: list of encoded images
         :param title: title text
         :param text: subtitle text
+        :return: list of encoded dm images
         """
         is_random = False
         if not title and not text:
             is_random = True
             if not self.dm_data:
-                return
+                return images
         w, h = 1024, 1150
+        result_images = []
         for file in images:
             if is_random:
                 result = choice(self.dm_data)
@@ -250,7 +365,7 @@ class Img:
                     title, text = result, ''
                 else:
                     title, text = result
-            src = Image.open(file)
+            src = Image.open(BytesIO(file))
             dst = Image.new('RGBA', (w, h), "black")
             draw = ImageDraw.Draw(dst, 'RGBA')
 
@@ -262,49 +377,45 @@ class Img:
             dst.paste(src, (64, 64))
 
             # Draw first line
-            _, _, width, height = draw.textbbox((0, 0), title, self.dm_title_font)
+            _, _, width, height = text_bbox(title, self.dm_title_font)
             draw.text((w/2 - width/2, 968), title, "white", self.dm_title_font)
 
             # Draw second line
-            _, _, width, height = draw.textbbox((0, 0), text, self.dm_font)
+            _, _, width, height = text_bbox(text, self.dm_font)
             draw.text((w/2 - width/2, 1048), text, "white", self.dm_font)
 
-            # Clear
-            dst.save(file)
-            del src
-            del dst
-            del draw
+            result_images.append(self._save(dst, False))
+        return result_images
 
     @staticmethod
     async def seam_carve(
-            images: List[str],
+            images: List[bytes],
             percent: int,
             msg: Message,
             token: str
     ) -> NoReturn:
         """Use seam carving on source image
 
-        :param images: images path
+        :param images: encoded images
         :param percent: resize percent
         :param msg: bot message
         :param token: access token
         """
         def task():
             i = 1.0 - (percent / 100)
-            print(images)
+            results = []
             for src in images:
-                img = np.array(Image.open(src))
+                img = np.array(Image.open(BytesIO(src)))
                 h, w, c = img.shape
                 backward = seam_carving.resize(img, (int(w*i), int(h*i)))
                 img = Image.fromarray(backward)
-                img.resize((w, h)).save(src)
-            # Upload and remove images
+                results.append(Img._encode(img.resize((w, h))))
+            # Upload images
             photos = []
             vk = VkApiGroup(token=token, api_version=5.131)
             uploader = VkUpload(vk)
-            for image in images:
-                photos.append(uploader.photo_messages(image, msg.peer_id))
-                os.remove(image)
+            for image in results:
+                photos.append(uploader.photo_messages(BytesIO(image), msg.peer_id))
             vk.method('messages.send', {
                 'attachment': ','.join([f'photo{i[0]["owner_id"]}_{i[0]["id"]}' for i in photos]),
                 'random_id': 0,
@@ -314,13 +425,12 @@ class Img:
 
     def create_grades(
             self,
-            file: str,
             grades: List[Grade],
             background: str,
             foreground: str,
             teacher: str,
             time: str
-    ) -> str:
+    ) -> bytes:
         grade_height = 128
         w = 1400
         w3 = w//3
@@ -336,9 +446,9 @@ class Img:
 
         # columns
         for i, v in enumerate(('Предмет', 'Оценки', 'Пропуски (часы)')):
-            _, _, cw, ch = draw.textbbox((0, 0), v, self.title_font)
-            draw.text(
-                (padding + w3*i + w3/2 - cw/2, padding + grade_height/2 - ch/2),
+            _, _, cw, ch = text_bbox(v, self.title_font)
+            self.sprites.text(
+                img, (padding + w3*i + w3/2 - cw/2, padding + grade_height/2 - ch/2),
                 v, foreground, self.title_font
             )
 
@@ -347,37 +457,35 @@ class Img:
             # title
             if len(grade.title) > 60:
                 grade.title = grade.title[:60] + '...'
-            title = '\n'.join(wrap(grade.title, 22))
-            _, _, tw, th = draw.multiline_textbbox((0, 0), title, self.title_font)
+            title = wrapped(grade.title, 22)
+            _, _, tw, th = multiline_text_bbox(title, self.title_font)
             draw.multiline_text(
                 (padding, y + grade_height/2 - th/2),
                 title, foreground, self.title_font
             )
             # skipped
-            _, _, tw, th = draw.textbbox((0, 0), grade.skipped, self.title_font)
-            draw.text(
-                (padding + w3*2 + w3/2 - tw/2, y + grade_height/2 - th/2),
+            _, _, tw, th = text_bbox(grade.skipped, self.title_font)
+            self.sprites.text(
+                img, (padding + w3*2 + w3/2 - tw/2, y + grade_height/2 - th/2),
                 grade.skipped, foreground, self.title_font
             )
             # all grades
-            _, _, nw, nh = draw.textbbox((0, 0), grade.final_grade, self.title_font)
+            _, _, nw, nh = text_bbox(grade.final_grade, self.title_font)
             grades_width = nw * len(grade.grades)+1 + len(grade.grades)*(padding/2)
             x = w3 + padding
             for g in grade.grades:
-                _, _, nw, nh = draw.textbbox((0, 0), str(g.grade), self.title_font)
-                draw.text(
-                    (x + w3/2 - grades_width/2, y + grade_height/2 - nh/2),
+                _, _, nw, nh = text_bbox(str(g.grade), self.title_font)
+                self.sprites.text(
+                    img, (x + w3/2 - grades_width/2, y + grade_height/2 - nh/2),
                     str(g.grade), teacher, self.title_font
                 )
                 x += nw + padding/2
             # final grade
-            _, _, nw, nh = draw.textbbox((0, 0), grade.final_grade, self.title_font)
-            draw.text(
-                (x + w3/2 - grades_width/2, y + grade_height / 2 - nh / 2),
+            _, _, nw, nh = text_bbox(grade.final_grade, self.title_font)
+            self.sprites.text(
+                img, (x + w3/2 - grades_width/2, y + grade_height / 2 - nh / 2),
                 grade.final_grade, time, self.title_font
             )
             y += grade_height
 
-        img.save(file)
-        del img
-        del draw
+        return self._save(img)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Provides RenderCache class"""
+from collections import OrderedDict
+from hashlib import sha1
+from json import dumps
+from typing import Dict, Any, Optional, NoReturn
+
+
+class RenderCache:
+    """LRU cache of uploaded attachments of rendered images
+
+    Entries are keyed by hash of image kind, rendered data and theme colors.
+    """
+    def __init__(self, max_entries: int = 4096):
+        """Initializes empty cache
+
+        :param max_entries: maximum of entries
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[str, str]' = OrderedDict()
+
+    @staticmethod
+    def key(kind: str, data: Dict[str, Any], *colors: str) -> str:
+        """Returns cache key
+
+        :param kind: image kind
+        :param data: rendered data
+        :param colors: theme colors
+        """
+        data = {k: v for k, v in data.items() if k != 'stale_since'}
+        raw = dumps([kind, data, [c.lower() for c in colors]], ensure_ascii=False, sort_keys=True)
+        return sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns attachment of rendered image
+
+        :param key: cache key
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry
+
+    def put(self, key: str, attachment: str) -> NoReturn:
+        """Stores attachment of rendered image
+
+        :param key: cache key
+        :param attachment: VK attachment string
+        """
+        self._data[key] = attachment
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters"""
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Provides Downloader class"""
+from asyncio import Semaphore, TimeoutError, create_task, gather
+from io import BytesIO
+from typing import Dict, Iterable, List, NoReturn, Optional
+
+from aiohttp import ClientSession, ClientTimeout, ClientError
+from PIL import Image
+
+
+class DownloadError(Exception):
+    """Photo can't be downloaded or exceeds limits"""
+
+
+class Downloader:
+    """Downloads photos concurrently into memory
+
+    Bodies are streamed in chunks and dropped as soon as they exceed
+    `max_bytes` or the image header declares more than `max_pixels`.
+    """
+    CHUNK = 64 * 1024
+    HEADER = 256 * 1024  # image header must be in these first bytes
+
+    def __init__(
+            self,
+            concurrency: int = 4,
+            timeout: float = 15,
+            max_bytes: int = 16 * 1024 * 1024,
+            max_pixels: int = 25_000_000
+    ):
+        """
+        :param concurrency: maximum of simultaneous downloads
+        :param timeout: download timeout in seconds
+        :param max_bytes: maximum of photo size in bytes
+        :param max_pixels: maximum of photo width multiplied by height
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.client: Optional[ClientSession] = None
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.rejected = 0
+        self._semaphore = Semaphore(concurrency)
+
+    async def fetch_all(self, urls: Iterable[str]) -> List[bytes]:
+        """Downloads photos simultaneously
+
+        :param urls: photo URLs
+        :return: encoded photos in the same order
+        :raises DownloadError: when any photo fails, the other downloads are cancelled
+        """
+        tasks = [create_task(self.fetch(url)) for url in urls]
+        try:
+            return list(await gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await gather(*tasks, return_exceptions=True)
+            raise
+
+    async def fetch(self, url: str) -> bytes:
+        """Downloads photo
+
+        :param url: photo URL
+        :return: encoded photo
+        """
+        async with self._semaphore:
+            try:
+                data = await self._download(url)
+            except (ClientError, TimeoutError) as e:
+                raise DownloadError(f'failed to download {url}: {e!r}') from e
+        self.downloads += 1
+        self.downloaded_bytes += len(data)
+        return data
+
+    async def close(self) -> NoReturn:
+        """Closes connection pool"""
+        if self.client is not None and not self.client.closed:
+            await self.client.close()
+        self.client = None
+
+    def stats(self) -> Dict[str, int]:
+        """Returns downloads counters"""
+        return {'downloads': self.downloads, 'bytes': self.downloaded_bytes, 'rejected': self.rejected}
+
+    def _session(self) -> ClientSession:
+        # Session must be created inside running event loop
+        if self.client is None or self.client.closed:
+            self.client = ClientSession(timeout=ClientTimeout(total=self.timeout))
+        return self.client
+
+    async def _download(self, url: str) -> bytes:
+        async with self._session().get(url) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > self.max_bytes:
+                self._reject(f'{url} is larger than {self.max_bytes} bytes')
+            buffer = bytearray()
+            checked = False
+            check_at = 0
+            async for chunk in response.content.iter_chunked(Downloader.CHUNK):
+                buffer += chunk
+                if len(buffer) > self.max_bytes:
+                    self._reject(f'{url} is larger than {self.max_bytes} bytes')
+                if not checked and len(buffer) >= check_at:
+                    checked = self._check_header(url, buffer)
+                    if not checked and len(buffer) >= Downloader.HEADER:
+                        self._reject(f'{url} is not an image')
+                    # Header is parsed again only when twice more bytes are received
+                    check_at = len(buffer) * 2
+            if not checked and not self._check_header(url, buffer):
+                self._reject(f'{url} is not an image')
+            return bytes(buffer)
+
+    def _check_header(self, url: str, buffer: bytearray) -> bool:
+        # Image.open reads header only, so pixels are not decoded here
+        try:
+            width, height = Image.open(BytesIO(buffer[:Downloader.HEADER])).size
+        except Exception:
+            return False
+        if width * height > self.max_pixels:
+            self._reject(f'{url} has more than {self.max_pixels} pixels')
+        return True
+
+    def _reject(self, reason: str) -> NoReturn:
+        self.rejected += 1
+        raise DownloadError(reason)
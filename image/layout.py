@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Provides Layout class"""
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+
+class Layout:
+    """Theme-independent drawing: one coverage mask per color role
+
+    Masks are merged into one palette-indexed image, where every role has
+    `LEVELS` antialiasing shades. Theme is applied by swapping the palette,
+    so one layout is recolored for any chat without drawing text again.
+    """
+    ROLES = ('foreground', 'teacher', 'time')
+    LEVELS = 16
+
+    def __init__(self, size: Tuple[int, int]):
+        """Creates empty masks
+
+        :param size: image size
+        """
+        self.masks = {role: Image.new('L', size, 0) for role in Layout.ROLES}
+        self.draw = {role: ImageDraw.Draw(mask) for role, mask in self.masks.items()}
+
+    def to_palette(self) -> Image.Image:
+        """Merges masks into palette-indexed image, later roles are drawn over earlier ones"""
+        indexes = None
+        for i, role in enumerate(Layout.ROLES):
+            mask = np.asarray(self.masks[role], dtype=np.uint16)
+            if indexes is None:
+                indexes = np.zeros(mask.shape, dtype=np.uint8)
+            level = (mask * (Layout.LEVELS - 1) + 127) // 255
+            covered = mask > 0
+            indexes[covered] = (1 + i * Layout.LEVELS + level[covered]).astype(np.uint8)
+        img = Image.fromarray(indexes, 'P')
+        img.putpalette([0] * 3 * (1 + len(Layout.ROLES) * Layout.LEVELS))
+        return img
+
+    @staticmethod
+    def palette(background: str, *colors: str) -> List[int]:
+        """Returns palette of background and role colors blended with it
+
+        :param background: background color
+        :param colors: color of each role
+        """
+        back = ImageColor.getrgb(background)[:3]
+        palette = list(back)
+        for color in colors:
+            fore = ImageColor.getrgb(color)[:3]
+            for level in range(Layout.LEVELS):
+                alpha = level / (Layout.LEVELS - 1)
+                palette += [round(b + (f - b) * alpha) for b, f in zip(back, fore)]
+        return palette
+
+    @staticmethod
+    def recolor(layout: Image.Image, background: str, foreground: str, teacher: str, time: str) -> Image.Image:
+        """Returns copy of layout with theme colors
+
+        :param layout: palette-indexed image made by `to_palette`
+        :param background: background color
+        :param foreground: foreground color
+        :param teacher: teacher color
+        :param time: time color
+        """
+        img = layout.copy()
+        img.putpalette(Layout.palette(background, foreground, teacher, time))
+        return img
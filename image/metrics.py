@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Provides memoized text measurement shared by all Img methods"""
+from functools import lru_cache
+from textwrap import wrap
+from typing import Dict, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+CACHE_SIZE = 4096
+
+# Measurement depends only on text and font, so one tiny canvas serves all
+_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def text_length(text: str, font: ImageFont.FreeTypeFont) -> float:
+    """Returns text advance length"""
+    return _draw.textlength(text, font)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def text_bbox(text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int, int, int]:
+    """Returns text bounding box drawn at (0, 0)"""
+    return _draw.textbbox((0, 0), text, font)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def multiline_text_bbox(text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int, int, int]:
+    """Returns multiline text bounding box drawn at (0, 0)"""
+    return _draw.multiline_textbbox((0, 0), text, font)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def wrapped(text: str, width: int) -> str:
+    """Returns text wrapped into lines of width"""
+    return '\n'.join(wrap(text, width))
+
+
+def cache_clear():
+    """Clears all measurement caches"""
+    for function in (text_length, text_bbox, multiline_text_bbox, wrapped):
+        function.cache_clear()
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Returns hit/miss counters of measurement caches"""
+    return {
+        function.__name__: function.cache_info()._asdict()
+        for function in (text_length, text_bbox, multiline_text_bbox, wrapped)
+    }
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Provides RenderService class"""
+from asyncio import get_running_loop
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Any, NoReturn, Optional
+
+from . import Img
+
+
+_worker: Optional[Img] = None
+
+
+def _init_worker(kwargs: Dict[str, Any]) -> NoReturn:
+    # Fonts are loaded once per worker process
+    global _worker
+    _worker = Img(**kwargs)
+
+
+def _call(method: str, args: tuple) -> Any:
+    return getattr(_worker, method)(*args)
+
+
+class RenderQueueFull(Exception):
+    """Raised when too many renders are waiting for workers"""
+
+
+class RenderService:
+    """Runs Img methods in a process pool off the event loop"""
+    def __init__(self, workers: int = 2, max_queue: int = 32, **img_kwargs):
+        """Starts worker processes
+
+        :param workers: count of worker processes
+        :param max_queue: maximum of running and waiting renders
+        :param img_kwargs: Img arguments
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        # Bot process has threads, forking it could copy locks held by them.
+        # Fork server imports main module once, so it must not open anything on import
+        context = get_context('forkserver')
+        context.set_forkserver_preload(['__main__', 'image.service'])
+        self.pool = ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker, initargs=(img_kwargs,)
+        )
+
+    async def render(self, method: str, *args) -> Any:
+        """Calls Img method in worker process
+
+        :param method: Img method name
+        :param args: method arguments
+        :return: method result
+        :raises RenderQueueFull: when queue depth limit is reached
+        """
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise RenderQueueFull(f'{self.pending} renders are waiting')
+        self.pending += 1
+        try:
+            return await get_running_loop().run_in_executor(self.pool, _call, method, args)
+        finally:
+            self.pending -= 1
+            self.rendered += 1
+
+    async def worker_stats(self) -> Dict[str, Any]:
+        """Returns render caches counters of one worker process"""
+        return await get_running_loop().run_in_executor(self.pool, _call, 'stats', ())
+
+    def close(self) -> NoReturn:
+        """Stops worker processes"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns queue counters"""
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'rendered': self.rendered,
+            'rejected': self.rejected,
+        }
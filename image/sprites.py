@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Provides SpriteCache class"""
+from collections import OrderedDict
+from typing import Dict, Iterable, NoReturn, Tuple, Union
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .metrics import text_bbox
+
+
+Sprite = Tuple[Image.Image, Tuple[int, int]]
+
+
+class SpriteCache:
+    """LRU cache of pre-rasterized text alpha masks
+
+    Recurring strings are shaped by FreeType once, then every drawing is a
+    paste of the cached mask with the target color.
+    """
+    def __init__(self, max_size: int = 1024):
+        """Initializes empty cache
+
+        :param max_size: maximum of cached masks
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Tuple[str, ImageFont.FreeTypeFont], Sprite]' = OrderedDict()
+
+    def get(self, text: str, font: ImageFont.FreeTypeFont) -> Sprite:
+        """Returns text mask and its offset from drawing position
+
+        :param text: single line text
+        :param font: font
+        """
+        key = (text, font)
+        sprite = self._data.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return sprite
+        self.misses += 1
+        left, top, right, bottom = text_bbox(text, font)
+        mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), text, 255, font)
+        sprite = (mask, (left, top))
+        self._data[key] = sprite
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        return sprite
+
+    def warm(self, pairs: Iterable[Tuple[str, ImageFont.FreeTypeFont]]) -> NoReturn:
+        """Rasterizes texts before they are drawn
+
+        :param pairs: (text, font) pairs
+        """
+        for text, font in pairs:
+            self.get(text, font)
+
+    def text(
+            self,
+            target: Image.Image,
+            xy: Tuple[float, float],
+            text: str,
+            fill: Union[str, int, Tuple[int, ...]],
+            font: ImageFont.FreeTypeFont
+    ) -> NoReturn:
+        """Draws single line text like ImageDraw.text
+
+        :param target: image to draw on
+        :param xy: drawing position
+        :param text: single line text
+        :param fill: text color
+        :param font: font
+        """
+        mask, (left, top) = self.get(text, font)
+        target.paste(fill, (round(xy[0]) + left, round(xy[1]) + top), mask)
+
+    def multiline_text(
+            self,
+            target: Image.Image,
+            xy: Tuple[float, float],
+            text: str,
+            fill: Union[str, int, Tuple[int, ...]],
+            font: ImageFont.FreeTypeFont,
+            spacing: int = 4
+    ) -> NoReturn:
+        """Draws left aligned multiline text like ImageDraw.multiline_text
+
+        :param target: image to draw on
+        :param xy: drawing position
+        :param text: text
+        :param fill: text color
+        :param font: font
+        :param spacing: lines spacing
+        """
+        line_spacing = text_bbox('A', font)[3] + spacing
+        for i, line in enumerate(text.split('\n')):
+            self.text(target, (xy[0], xy[1] + i * line_spacing), line, fill, font)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Returns size and hit rate"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
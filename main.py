@@ -1,78 +1,232 @@
 # -*- coding: utf-8 -*-
 import re
-from random import randint, choice
-from time import time
-from os import remove
-from secrets import token_hex
+from random import choice
+from time import perf_counter
+from datetime import datetime
 
-from re import findall, compile, IGNORECASE
-from typing import Union, List, Pattern
+from functools import wraps
+from typing import List, Optional
 
-import requests
 import openai
 from vkbottle import PhotoMessageUploader
 from vkbottle.api import API
 from vkbottle.bot import Bot, Message
-from vkbottle.dispatch.rules.base import RegexRule
 from ktc_api.aio import AKTCClient
-from markovify.text import Text
 
-from college_api import CollegeAPI
-from db import DB, Chat
+from college_api.aio import ACollegeAPI
+from college_api.cache import TimetableCache
+from college_api.prefetch import PrefetchScheduler
+from college_api.store import TimetableStore
+from college_api.diff import Change
+from db import DB, Chat, User
 from image import Img
-from config import GROUP_TOKEN, DM_DATA, VOTE_TIMEOUT, ADMINS, MESSAGE_STATES, OPENAI_API_KEY
+from image.cache import RenderCache
+from image.download import Downloader, DownloadError
+from image.service import RenderService, RenderQueueFull
+from markov import MarkovCache
+from broadcast import Broadcaster
+from router import Router
+from config import (
+    GROUP_TOKEN, DM_DATA, VOTE_TIMEOUT, ADMINS, MESSAGE_STATES, OPENAI_API_KEY,
+    COLLEGE_TIMEOUT, COLLEGE_POOL_SIZE, TIMETABLE_TTL, TIMETABLE_STALE_TTL, TIMETABLE_CACHE_SIZE,
+    PREFETCH_TIMES, PREFETCH_CONCURRENCY, PREFETCH_INTERVAL, COURSES_INTERVAL, TIMETABLE_STORE,
+    RENDER_CACHE_SIZE, RENDER_WORKERS, RENDER_QUEUE,
+    IMAGE_FORMAT, IMAGE_PALETTE, IMAGE_OPTIMIZE, IMAGE_COMPRESS_LEVEL, RENDER_LAYOUTS,
+    RENDER_SPRITES, DB_PATH, DB_COMMIT_WINDOW, DB_COMMIT_SIZE,
+    PHRASES_SIZE, PHRASES_AGE, MARKOV_CACHE_SIZE, DB_USERS_CACHE, DB_CHATS_CACHE,
+    LEADERBOARD_SIZE, BROADCAST_CONCURRENCY, BROADCAST_RATE, BROADCAST_RETRIES,
+    DOWNLOAD_CONCURRENCY, DOWNLOAD_TIMEOUT, DOWNLOAD_MAX_BYTES, DOWNLOAD_MAX_PIXELS,
+    DM_PHOTO_SIZE, SEAM_CARVE_PHOTO_SIZE
+)
 
+started = perf_counter()
 api = API(token=GROUP_TOKEN)
 bot = Bot(api=api)
 bot.labeler.vbml_ignore_case = True
 uploader = PhotoMessageUploader(api=api)
-db = DB(api)
-college = CollegeAPI()
-client = AKTCClient()
-image_worker = Img(dm_data=DM_DATA)
+db: DB
+broadcaster: Broadcaster
+markov: MarkovCache
+college: ACollegeAPI
+prefetch: PrefetchScheduler
+client: AKTCClient
+renderer: RenderService
+render_cache = RenderCache(RENDER_CACHE_SIZE)
+downloader = Downloader(DOWNLOAD_CONCURRENCY, DOWNLOAD_TIMEOUT, DOWNLOAD_MAX_BYTES, DOWNLOAD_MAX_PIXELS)
 
 openai.api_key = OPENAI_API_KEY
 
 
-class IRegexRule(RegexRule):
-    def __init__(self, regexp: Union[str, List[str], Pattern, List[Pattern]]):
-        super().__init__(regexp)
-        if isinstance(regexp, Pattern):
-            regexp = [regexp]
-        elif isinstance(regexp, str):
-            regexp = [compile(regexp, IGNORECASE)]
-        elif isinstance(regexp, list):
-            regexp = [compile(exp, IGNORECASE) for exp in regexp]
+async def notify_changes(group_id: int, timetable: dict, changes: List[Change]):
+    """Sends timetable changes to chats of group"""
+    chats = await db.get_chats_by_group(group_id)
+    if not chats:
+        return
+    icons = {
+        Change.ADDED: '➕', Change.REMOVED: '➖', Change.MOVED: '🔀',
+        Change.TEACHER: '👤', Change.CLASSROOM: '🚪'
+    }
+    lines = [f"🔔 Расписание {timetable['week_number']} неделя изменять:"]
+    for change in changes:
+        line = f"{icons[change.kind]} {change.day}, {change.lesson['time'][0]}. {change.lesson['title']}"
+        if change.old is not None:
+            line += f": {change.old} → {change.new}"
+        lines.append(line)
+    for i in range(0, len(chats), 99):
+        await api.messages.send(
+            peer_ids=','.join(str(chat.chat_id) for chat in chats[i:i + 99]),
+            message='\n'.join(lines), random_id=0)
+
+
+async def on_startup():
+    await college.init()
+    prefetch.start()
+    await broadcaster.resume()
+    print(f"Started in {perf_counter() - started:.3f}s with {len(college.groups)} known groups")
+
+
+async def on_shutdown():
+    await prefetch.stop()
+    await broadcaster.stop()
+    await college.close()
+    await downloader.close()
+    renderer.close()
+    await markov.flush()
+    db.close()
+
+
+def setup():
+    """Opens database and clients
 
-        self.regexp = regexp
+    It is not called on import, render worker processes import this module too.
+    """
+    global db, broadcaster, markov, college, prefetch, client, renderer
+    db = DB(
+        api, DB_PATH, DB_COMMIT_WINDOW, DB_COMMIT_SIZE, PHRASES_SIZE, PHRASES_AGE,
+        DB_USERS_CACHE, DB_CHATS_CACHE, LEADERBOARD_SIZE
+    )
+    broadcaster = Broadcaster(api, db, BROADCAST_CONCURRENCY, BROADCAST_RATE, BROADCAST_RETRIES)
+    markov = MarkovCache(db, MARKOV_CACHE_SIZE)
+    college = ACollegeAPI(
+        COLLEGE_TIMEOUT, COLLEGE_POOL_SIZE,
+        cache=TimetableCache(TIMETABLE_TTL, TIMETABLE_STALE_TTL, TIMETABLE_CACHE_SIZE),
+        store=TimetableStore(TIMETABLE_STORE)
+    )
+    prefetch = PrefetchScheduler(
+        college, db.get_group_ids,
+        PREFETCH_TIMES, PREFETCH_CONCURRENCY, PREFETCH_INTERVAL, COURSES_INTERVAL
+    )
+    client = AKTCClient()
+    renderer = RenderService(
+        RENDER_WORKERS, RENDER_QUEUE,
+        dm_data=DM_DATA, image_format=IMAGE_FORMAT, palette=IMAGE_PALETTE,
+        optimize=IMAGE_OPTIMIZE, compress_level=IMAGE_COMPRESS_LEVEL,
+        layouts_size=RENDER_LAYOUTS, sprites_size=RENDER_SPRITES
+    )
+    college.on_change.append(notify_changes)
+    bot.loop_wrapper.on_startup.append(on_startup())
+    bot.loop_wrapper.on_shutdown.append(on_shutdown())
+
+
+router = Router()
+DAY_KEYWORDS = (
+    'сегодня', 'today', 'завтра', 'tomorrow', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday',
+    'понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота'
+)
 
 
 async def chat_not_installed(msg: Message):
     await msg.answer("Необходимо настроить текущую группу.\nИспользуйте комманду /группа ГРУППА")
 
 
-def get_attachments_photo(msg: Message):
+def stale_note(data: dict) -> str:
+    """Returns warning, if timetable was taken from store because college site is down
+
+    :param data: timetable or day data
+    """
+    if 'stale_since' not in data:
+        return ''
+    return f"\n⚠ Сайт колледж не работать. Расписание от {datetime.fromtimestamp(data['stale_since']):%d.%m %H:%M}"
+
+
+async def render_timetable(kind: str, method: str, data: dict, chat: Chat) -> str:
+    """Renders and uploads timetable image or reuses attachment of the same one
+
+    :param kind: image kind
+    :param method: Img method name
+    :param data: timetable or day data
+    :param chat: chat with theme colors
+    :return: attachment
+    """
+    colors = (chat.timetable_back, chat.timetable_fore, chat.timetable_teacher, chat.timetable_time)
+    key = render_cache.key(kind, data, *colors)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached
+    content = await renderer.render(method, data, *colors)
+    photo = await uploader.upload(content)
+    render_cache.put(key, photo)
+    return photo
+
+
+def renders(handler):
+    """Answers that bot is busy, when render queue is full"""
+    @wraps(handler)
+    async def wrapper(msg: Message, *args, **kwargs):
+        try:
+            return await handler(msg, *args, **kwargs)
+        except RenderQueueFull:
+            await msg.answer('⌛ Бот занят рисовать. Попробовать позже.')
+    return wrapper
+
+
+def get_attachments_photo(msg: Message, target: int):
     """Gets attachments from message
 
     :param msg: message object
+    :param target: the smallest needed photo side, the largest photo is taken when all are smaller
     :return: list of photo URLs
     """
     urls = []
     for attachment in msg.attachments:
         if attachment.type.value == "photo":
-            w, url = 0, None
-            for size in attachment.photo.sizes:
-                if size.width > w:
-                    w, url = size.width, size.url
-            if url is not None:
-                urls.append(url)
+            sizes = sorted(attachment.photo.sizes or [], key=lambda size: min(size.width, size.height))
+            fit = [size for size in sizes if min(size.width, size.height) >= target]
+            if fit:
+                urls.append(fit[0].url)
+            elif sizes:
+                urls.append(sizes[-1].url)
     return urls
 
 
-@bot.on.message(IRegexRule(r"/?(help|commands|команды|помощь)"))
+async def download_photos(msg: Message, target: int) -> Optional[List[bytes]]:
+    """Downloads photos of message, replied message or forwarded messages
+
+    :param msg: message object
+    :param target: the smallest needed photo side
+    :return: encoded photos or None when message has no photos or they can't be downloaded
+    """
+    urls = get_attachments_photo(msg, target)
+    if not urls and msg.reply_message:
+        urls = get_attachments_photo(msg.reply_message, target)
+    if not urls and msg.fwd_messages:
+        for fwd in msg.fwd_messages:
+            urls += get_attachments_photo(fwd, target)
+    # Check urls
+    if not urls:
+        await msg.answer(f"Вы надо отправить чат картинка.")
+        return None
+    try:
+        return await downloader.fetch_all(urls)
+    except DownloadError as e:
+        print(f"Failed to download photos: {e!r}")
+        await msg.answer('❌ Картинка не скачать или слишком большой.')
+        return None
+
+
+@router.command(r"/?(?:help|commands|команды|помощь)", 'help', 'commands', 'команды', 'помощь')
 async def help_message(msg: Message):
     """Sends help message"""
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
     await msg.answer(
         "Вот, что я умею:\n"
         "◾ помощь - сообщение с доступными командами;\n"
@@ -81,7 +235,7 @@ async def help_message(msg: Message):
         "◾ след неделя - расписание на следующую неделю;\n"
         "◾ фронт/бэк/время/учитель <HEX цвет> - изменение цвета фона и текста для расписания;\n"
         "◾ дм <верхний текст><с новой строки нижний текст> - генерирует демотиватор;\n"
-        "◾ топ/низ - показывает топ пользователей по карме;\n"
+        "◾ топ/низ [чат] - показывает топ пользователей по карме;\n"
         "◾ +/- - проголосовать за пользователя;\n"
         "◾ сегодня/завтра/день недели - расписание на день.\n\n"
         "❗ вместо <ДАННЫЕ> пишите свои данные без <>\n"
@@ -89,11 +243,11 @@ async def help_message(msg: Message):
     )
 
 
-@bot.on.message(IRegexRule(r'/?gpt\s+([\s\S]+)'))
-async def chatgpt(msg: Message):
+@router.command(r'/?gpt\s+([\s\S]+)', 'gpt')
+async def chatgpt(msg: Message, prompt: str):
     completion = openai.Completion.create(
         engine='text-curie-001',
-        prompt=findall(r'/?gpt\s+([\s\S]+)', msg.text)[0],
+        prompt=prompt,
         max_tokens=1024,
         temperature=0.5,
         top_p=1,
@@ -103,97 +257,80 @@ async def chatgpt(msg: Message):
     await msg.answer(completion.choices[0]['text'])
 
 
-@bot.on.message(IRegexRule(r"/?(группа|group)\s+\w{1,3}([\s\.\-]\d{2,3})+?"))
-async def change_group(msg: Message):
+@router.command(r"/?(?:группа|group)\s+(\w{1,3}(?:[\s.\-]\d{1,3})+)", 'группа', 'group')
+async def change_group(msg: Message, group: str):
     """Changes current chat group"""
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    chat = db.get_or_add_chat(msg.peer_id)
-    group = college.to_group_name(findall(r'(\w{1,3}([\s.\-]\d{1,3})+)', msg.text)[0][0])
+    group = college.to_group_name(group)
     group_data = college.get_group(group)
     if group_data is None:
-        await msg.answer(f"Группа такой имя нет ❌")
+        suggested = college.suggest_group(group)
+        if suggested is not None:
+            await msg.answer(f"Группа такой имя нет ❌\nВы иметь в виду {suggested['title']}?")
+        else:
+            await msg.answer(f"Группа такой имя нет ❌")
         return
-    db.change_chat_group(msg.peer_id, group_data['id'], group_data['title'])
+    await db.change_chat_group(msg.peer_id, group_data['id'], group_data['title'])
     await msg.answer(f"Группа {group_data['title']} установить этот чат ✔")
 
 
-@bot.on.message(IRegexRule(r"/?(fore|back|фронт|бек|бэк|teacher|time|учитель|время)\s+#[0-9a-fA-F]{6}"))
-async def change_timetable_color(msg: Message):
+@router.command(
+    r"/?(fore|back|фронт|бек|бэк|teacher|time|учитель|время)\s+(#[0-9a-fA-F]{8}|#[0-9a-fA-F]{6})",
+    'fore', 'back', 'фронт', 'бек', 'бэк', 'teacher', 'time', 'учитель', 'время'
+)
+async def change_timetable_color(msg: Message, word: str, color: str, chat: Chat):
     """Changes current chat timetable foreground or background"""
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    chat = db.get_or_add_chat(msg.peer_id)
-    word, color = findall(
-        r"/?(fore|back|фронт|бек|бэк|teacher|time|учитель|время)\s+(#[0-9a-fA-F]{6}|#[0-9a-fA-F]{8})",
-        msg.text)[0]
-    match word:
+    match word.lower():
         case "fore" | "фронт":
-            db.change_chat_tt_fore(chat.chat_id, color)
+            await db.change_chat_tt_fore(chat.chat_id, color)
             await msg.answer(f"Цвет текст расписание готово ✔")
         case "back" | "бэк" | "бек":
-            db.change_chat_tt_back(chat.chat_id, color)
+            await db.change_chat_tt_back(chat.chat_id, color)
             await msg.answer(f"Фон расписание готово ✔")
         case "teacher" | "учитель":
-            db.change_chat_tt(chat.chat_id, 'tt_teacher', color)
+            await db.change_chat_tt(chat.chat_id, 'tt_teacher', color)
             await msg.answer(f"Цвет учитель готово ✔")
         case "time" | "время":
-            db.change_chat_tt(chat.chat_id, 'tt_time', color)
+            await db.change_chat_tt(chat.chat_id, 'tt_time', color)
             await msg.answer(f"Цвет время готово ✔")
 
 
-@bot.on.message(IRegexRule(r"/?(расписание|timetable)"))
-async def get_timetable(msg: Message):
+@router.command(r"/?(?:расписание|timetable)", 'расписание', 'timetable')
+@renders
+async def get_timetable(msg: Message, chat: Chat):
     """Sends actual timetable if available"""
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    chat = db.get_or_add_chat(msg.peer_id)
     if chat.title == '':
         await chat_not_installed(msg)
         return
-    timetable = college.get_timetable(chat.group_id)
-    name = token_hex(16) + '.png'
-    image_worker.from_timetable(
-        name, timetable,
-        chat.timetable_back, chat.timetable_fore,
-        chat.timetable_teacher, chat.timetable_time)
-    photo = await PhotoMessageUploader(api=api).upload(name)
-    remove(name)
-    await msg.answer(f"Расписание текущий неделя:", attachment=photo)
-
-
-@bot.on.message(IRegexRule(r"/?(след\s+неделя|следующая\s+неделя|next\s+week)"))
-async def get_next_week_timetable(msg: Message):
+    timetable = await college.get_timetable(chat.group_id)
+    photo = await render_timetable('week', 'from_timetable', timetable, chat)
+    await msg.answer(f"Расписание текущий неделя:{stale_note(timetable)}", attachment=photo)
+
+
+@router.command(r"/?(?:след\s+неделя|следующая\s+неделя|next\s+week)", 'след', 'следующая', 'next')
+@renders
+async def get_next_week_timetable(msg: Message, chat: Chat):
     """Sends actual timetable for the next week if available"""
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    chat = db.get_or_add_chat(msg.peer_id)
     if chat.title == '':
         await chat_not_installed(msg)
         return
-    timetable = college.get_timetable(chat.group_id)
-    timetable = college.get_timetable(chat.group_id, int(timetable['week_number']) + 1)
-    name = token_hex(16) + '.png'
-    image_worker.from_timetable(
-        name, timetable,
-        chat.timetable_back, chat.timetable_fore,
-        chat.timetable_teacher, chat.timetable_time)
-    photo = await PhotoMessageUploader(api=api).upload(name)
-    remove(name)
-    await msg.answer(f"Расписание следующая неделя:", attachment=photo)
-
-
-@bot.on.message(
-    IRegexRule(
-        r"\A\s*/?\s*(сегодня|today|завтра|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|"
-        r"понедельник|вторник|среда|четверг|пятница|суббота)\s*\Z")
+    timetable = await college.get_timetable(chat.group_id)
+    timetable = await college.get_timetable(chat.group_id, int(timetable['week_number']) + 1)
+    photo = await render_timetable('week', 'from_timetable', timetable, chat)
+    await msg.answer(f"Расписание следующая неделя:{stale_note(timetable)}", attachment=photo)
+
+
+@router.command(
+    r"\A\s*/?\s*(сегодня|today|завтра|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|"
+    r"понедельник|вторник|среда|четверг|пятница|суббота)\s*\Z",
+    *DAY_KEYWORDS
 )
-async def get_day_timetable(msg: Message):
+@renders
+async def get_day_timetable(msg: Message, text: str, chat: Chat):
     """Sends actual timetable for day"""
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    text = msg.text.lstrip('/').lower()
-    chat = db.get_or_add_chat(msg.peer_id)
+    text = text.lower()
     if chat.title == '':
         await chat_not_installed(msg)
         return
-    # Generate random file name
-    name = token_hex(16) + '.png'
     # if day is None - day is current
     day = None
     # works when day is None
@@ -213,216 +350,194 @@ async def get_day_timetable(msg: Message):
             day = 4
         case 'saturday' | 'суббота':
             day = 5
-    image_worker.from_day(
-        name, college.get_day(chat.group_id, day, tomorrow),
-        chat.timetable_back, chat.timetable_fore,
-        chat.timetable_teacher, chat.timetable_time
-    )
-    photo = await uploader.upload(name)
-    remove(name)
-    await msg.answer(f"Расписание {text}:", attachment=photo)
+    day_data = await college.get_day(chat.group_id, day, tomorrow)
+    photo = await render_timetable('day', 'from_day', day_data, chat)
+    await msg.answer(f"Расписание {text}:{stale_note(day_data)}", attachment=photo)
 
 
-@bot.on.message(IRegexRule(r"/?(dm|дм)([\s\S]+)?"))
-async def dm(msg: Message):
+@router.command(r"/?(?:dm|дм)([\s\S]+)?", 'dm', 'дм')
+@renders
+async def dm(msg: Message, text: Optional[str]):
     """Sends demotivator"""
-    # Get attachments from message
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    urls = get_attachments_photo(msg)
-    if not urls and msg.reply_message:
-        urls = get_attachments_photo(msg.reply_message)
-    if not urls and msg.fwd_messages:
-        for fwd in msg.fwd_messages:
-            urls += get_attachments_photo(fwd)
-    # Check urls
-    if not urls:
-        await msg.answer(f"Вы надо отправить чат картинка.")
+    images = await download_photos(msg, DM_PHOTO_SIZE)
+    if images is None:
         return
-    # Download images
-    images = []
-    for url in urls:
-        name = token_hex(24) + '.png'
-        with open(name, 'wb') as f:
-            f.write(requests.get(url).content)
-        images.append(name)
     # Translate images to demotivators
     count = 1
-    _, text = findall(r"/?(dm|дм)([\s\S]+)?", msg.text)[0]
-    text = text.strip()
+    text = (text or '').strip()
     if not text:
-        image_worker.create_dm(images)
+        images = await renderer.render('create_dm', images)
     elif text.isdigit():
         count = int(text)
         if count > 10:
             await msg.answer('Слишком большое количество повторений. Максимум 10.')
             return
         for i in range(count):
-            image_worker.create_dm(images)
+            images = await renderer.render('create_dm', images)
     else:
         data = text.strip().split('\n')
         if len(data) % 2 != 0:
             data.append('')
         for i, j in zip(data[0::2], data[1::2]):
             if not i and not j:
-                image_worker.create_dm(images)
+                images = await renderer.render('create_dm', images)
             else:
-                image_worker.create_dm(images, i, j)
-    # Upload and remove images
+                images = await renderer.render('create_dm', images, i, j)
+    # Upload images
     photos = []
     for image in images:
         photos.append(await uploader.upload(image))
-        remove(image)
     await msg.answer(attachment=','.join(photos))
 
 
-@bot.on.message(IRegexRule(r'/?(top|топ|down|низ)'))
-async def show_top(msg: Message):
-    command = findall(r'/?(top|топ|down|низ)', msg.text, IGNORECASE)[0].lower()
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    users = []
-    match command:
-        case 'top' | 'топ':
-            users = db.get_users(10)
-        case 'down' | 'низ':
-            users = db.get_users(10, True)
+@router.command(r'/?(top|топ|down|низ)(\s+(?:chat|чат))?', 'top', 'топ', 'down', 'низ')
+async def show_top(msg: Message, command: str, in_chat: Optional[str]):
+    need_reverse = command.lower() in ('down', 'низ')
+    if in_chat and msg.peer_id > 2e9:
+        users = await db.get_chat_users(msg.peer_id, LEADERBOARD_SIZE, need_reverse)
+    else:
+        users = await db.get_users(LEADERBOARD_SIZE, need_reverse)
     await msg.answer(
         '\n'.join(f'{i + 1}. [id{v.uid}|{v.nickname}] ({v.count})'
                   for i, v in enumerate(users))
     )
 
 
-@bot.on.message(IRegexRule(r'\A\s*/?карма\s*\Z'))
-async def karma(msg: Message):
-    if msg.from_id > 0:
-        user = await db.get_or_add_user_hate_niggers(msg.from_id)
+@router.command(r'\A\s*/?карма\s*\Z', 'карма')
+async def karma(msg: Message, user: User):
+    if user is not None:
         await msg.answer(f'Ваш социальный кредит: {user.count}')
 
 
-@bot.on.message(IRegexRule(r'/?([\+\-])'))
-async def incdec_count(msg: Message):
+@router.command(r'/?([+\-])', '+', '-')
+async def incdec_count(msg: Message, command: str, user: User):
+    # user is taken to create voter row, cooldown is checked by db.vote
     if msg.reply_message is None:
         return
     if msg.reply_message.from_id == msg.from_id:
         await msg.answer('❌ Нельзя менять социальный кредит сам себя.')
         return
-    command = findall(r'/?([+\-])', msg.text, IGNORECASE)[0]
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    timeout = time() - user.last_vote
-    if timeout < VOTE_TIMEOUT:
-        timeout = VOTE_TIMEOUT - timeout
+    if msg.reply_message.from_id <= 0:
+        return
+    by = 1 if command == '+' else -1
+    chat_id = msg.peer_id if msg.peer_id > 2e9 else None
+    other, timeout = await db.vote(msg.from_id, msg.reply_message.from_id, by, VOTE_TIMEOUT, chat_id)
+    if other is None:
         hours = str(int(timeout // 60 // 60)).zfill(2)
         mins = str(int((timeout // 60) - (timeout // 60 // 60))).zfill(2)
         seconds = str(int(timeout - timeout // 60 * 60)).zfill(2)
         await msg.answer(f'❌ Извинение ты пока не может голосовать. ⌛ Ждать {hours}:{mins}:{seconds}')
         return
-    other = await db.get_or_add_user_hate_niggers(msg.reply_message.from_id)
-    result = other.count
-    if command == '+':
-        await db.inc_user_count(msg.from_id, msg.reply_message.from_id)
-        result += 1
-    else:
-        await db.inc_user_count(msg.from_id, msg.reply_message.from_id, -1)
-        result -= 1
-    await msg.answer(f'Социальный кредит [id{other.uid}|{other.nickname}] изменять: {other.count} → {result}')
+    await msg.answer(
+        f'Социальный кредит [id{other.uid}|{other.nickname}] изменять: {other.count - by} → {other.count}'
+    )
 
 
-@bot.on.message(IRegexRule(r'/?рассылка ([\s\S]+)'))
-async def send_all(msg: Message):
+@router.command(r'/?рассылка ([\s\S]+)', 'рассылка')
+async def send_all(msg: Message, text: str):
     if msg.from_id not in ADMINS:
         await msg.answer('❌ Извенять. Вы нет права.')
         return
-    chats = db.cursor.execute('SELECT * FROM chat').fetchall()
-    chats = [Chat.from_tuple(i) for i in chats]
-    text = findall(r'/?рассылка ([\s\S]+)', msg.text)[0]
-    chats = [chats[i:i + 99] for i in range(0, len(chats), 99)]
-    for c in chats:
-        await api.messages.send(
-            peer_ids=','.join([str(chat.chat_id) for chat in c]),
-            message=text, random_id=randint(0, 2e3))
+    broadcast_id, count = await broadcaster.start(text, msg.from_id)
+    await msg.answer(f'📨 Рассылка {broadcast_id} начинать: {count} чат. Отчёт прислать потом.')
 
 
-@bot.on.message(IRegexRule(r'/?(жмых|seam carve)(\s+\d{1,2})?'))
-async def seam_carve_img(msg: Message):
+@router.command(r'\A\s*/?(?:stats|статистика)\s*\Z', 'stats', 'статистика')
+async def show_stats(msg: Message):
+    if msg.from_id not in ADMINS:
+        await msg.answer('❌ Извенять. Вы нет права.')
+        return
+    sections = {
+        'College API': college.stats(),
+        'Render cache': render_cache.stats(),
+        'Renderer': renderer.stats(),
+        'Render worker': await renderer.worker_stats(),
+        'Database': db.stats(),
+        'Markov': markov.stats(),
+        'Broadcast': broadcaster.stats(),
+        'Downloads': downloader.stats(),
+    }
+    await msg.answer('\n\n'.join(
+        f'{title}:\n' + '\n'.join(f'◾ {k}: {v}' for k, v in stats.items())
+        for title, stats in sections.items()
+    ))
+
+
+@router.command(r'/?(?:жмых|seam carve)(?:\s+(\d{1,3}))?', 'жмых', 'seam carve')
+async def seam_carve_img(msg: Message, command: Optional[str]):
     percent = 25
-    command = findall(r'/?(жмых|seam carve)(\s+\d{1,3})?', msg.text)[0][1].strip()
     if command:
         percent = int(command)
         if percent > 99:
             await msg.answer('Процент не быть больше 100')
             return
-    user = await db.get_or_add_user_hate_niggers(msg.from_id)
-    urls = get_attachments_photo(msg)
-    if not urls and msg.reply_message:
-        urls = get_attachments_photo(msg.reply_message)
-    if not urls and msg.fwd_messages:
-        for fwd in msg.fwd_messages:
-            urls += get_attachments_photo(fwd)
-    # Check urls
-    if not urls:
-        await msg.answer(f"Вы надо отправить чат картинка.")
+    images = await download_photos(msg, SEAM_CARVE_PHOTO_SIZE)
+    if images is None:
         return
-    # Download images
-    images = []
-    for url in urls:
-        name = token_hex(24) + '.png'
-        with open(name, 'wb') as f:
-            f.write(requests.get(url).content)
-        images.append(name)
     await msg.answer('Начинать работать ...')
-    await image_worker.seam_carve(images, percent, msg, GROUP_TOKEN)
+    await Img.seam_carve(images, percent, msg, GROUP_TOKEN)
 
 
-@bot.on.message(IRegexRule(r'/?(login|логин|вход|auth)\s+(\S+)\s+(\S+)'))
-async def auth(msg: Message):
+@router.command(r'/?(?:login|логин|вход|auth)\s+(\S+)\s+(\S+)', 'login', 'логин', 'вход', 'auth')
+async def auth(msg: Message, login: str, password: str):
     if msg.peer_id > 2e9:
         await msg.answer('❌ Входить проколедж только личный сообщение')
         return
-    command, login, password = findall(r'/?(login|логин|вход|auth)\s+(\S+)\s+(\S+)', msg.text)[0]
-    pro = db.auth(msg.from_id, login, password)
+    pro = await db.auth(msg.from_id, login, password)
     await msg.answer('✅ Данный вход сохранить. Теперь разрешать смотреть оценка.')
 
 
-@bot.on.message(IRegexRule(r"/?(оценки|grades)"))
-async def get_next_week_timetable(msg: Message):
+@router.command(r"/?(?:оценки|grades)", 'оценки', 'grades')
+@renders
+async def get_next_week_timetable(msg: Message, chat: Chat):
     """Sends actual timetable for the next week if available"""
-    pro = db.get_or_add_pro(msg.from_id)
-    chat = db.get_or_add_chat(msg.peer_id)
-    name = token_hex(16) + '.png'
+    pro = await db.get_or_add_pro(msg.from_id)
     try:
-        image_worker.create_grades(
-            name, await client.grades(pro.login, pro.password),
+        image = await renderer.render(
+            'create_grades', await client.grades(pro.login, pro.password),
             chat.timetable_back, chat.timetable_fore,
             chat.timetable_teacher, chat.timetable_time
         )
+    except RenderQueueFull:
+        raise
     except Exception:
         await msg.answer("Случился ошибка. Caught system_error with code 9")
         return
-    photo = await PhotoMessageUploader(api=api).upload(name)
-    remove(name)
+    photo = await uploader.upload(image)
     await msg.answer(f"Ваши оценки:\nЧтобы войти в ProCollege, напишите /логин ЛОГИН ПАРОЛЬ", attachment=photo)
 
 
-@bot.on.chat_message()
 async def on_chat_message(msg: Message):
-    state = db.inc_state(msg.peer_id, re.sub(r"{[^}]+}", "", msg.text))
+    phrase = re.sub(r"{[^}]+}", "", msg.text)
+    state = await db.inc_state(msg.peer_id, phrase)
+    markov.learn(msg.peer_id, state.seq, phrase, state.removed)
     if state.state == 0:
+        # Deferred messages are learned even when chosen message has no sentences
+        await markov.catch_up(msg.peer_id)
         text = choice(MESSAGE_STATES)
-        model = Text(state.text, well_formed=False)
+        words = msg.text.split()
         for i in re.findall(r"{markov(\d+)}", text):
-            try:
-                sentence = model.make_sentence_with_start(msg.text.split()[-1], strict=False, tries=25)
-            except Exception:
-                sentence = None
-            if sentence is None:
-                sentence = model.make_short_sentence(int(i), tries=25)
-            if sentence is None:
-                sentence = model.make_sentence(tries=25)
-            if sentence is None:
-                sentence = ""
+            sentence = await markov.sentence(msg.peer_id, words[-1] if words else None, int(i))
             text = text.replace("{markov" + i + "}", sentence)
         await msg.answer(text)
 
 
+@bot.on.message()
+async def on_message(msg: Message):
+    """Routes commands, other chat messages are learned for random messages
+
+    User and chat are added only for commands which need them.
+    """
+    routed = await router.dispatch(
+        msg,
+        user=lambda: db.get_or_add_user_hate_niggers(msg.from_id),
+        chat=lambda: db.get_or_add_chat(msg.peer_id)
+    )
+    if not routed and msg.peer_id > 2e9:
+        await on_chat_message(msg)
+
+
 if __name__ == '__main__':
     print("Starting ...")
+    setup()
     bot.run_forever()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Provides per-chat incremental markov chains"""
+import json
+import zlib
+from asyncio import get_running_loop
+from collections import OrderedDict
+from typing import Callable, Dict, List, NoReturn, Optional, Tuple, TypeVar
+
+from markovify.chain import Chain, BEGIN, END
+from markovify.splitters import split_into_sentences
+from markovify.text import Text
+
+from db import DB
+
+
+State = Tuple[str, ...]
+Model = Dict[State, Dict[str, int]]
+Removed = List[Tuple[int, str]]
+T = TypeVar('T')
+
+
+def runs(text: str, state_size: int) -> List[Tuple[State, str]]:
+    """Returns (state, next word) transitions of text
+
+    :param text: message text
+    :param state_size: count of words in state
+    """
+    result = []
+    for sentence in split_into_sentences(text):
+        words = [BEGIN] * state_size + sentence.split() + [END]
+        if len(words) == state_size + 1:
+            continue
+        for i in range(len(words) - state_size):
+            result.append((tuple(words[i:i + state_size]), words[i + state_size]))
+    return result
+
+
+def dumps(model: Model) -> bytes:
+    """Returns compressed chain"""
+    return zlib.compress(json.dumps([[list(k), v] for k, v in model.items()], ensure_ascii=False).encode(), 6)
+
+
+def loads(data: bytes) -> Model:
+    """Returns chain from compressed data"""
+    return {tuple(k): v for k, v in json.loads(zlib.decompress(data))}
+
+
+def make_sentence(model: Model, state_size: int, start: Optional[str], max_chars: int) -> str:
+    """Generates sentence, cost depends on sentence length only
+
+    :param model: chain transitions
+    :param state_size: count of words in state
+    :param start: first word of sentence if it can begin sentence
+    :param max_chars: preferred maximum of characters
+    """
+    if (BEGIN,) * state_size not in model:
+        return ''
+    text = Text(None, state_size, Chain(None, state_size, model), retain_original=False, well_formed=False)
+    sentence = None
+    if start:
+        try:
+            sentence = text.make_sentence_with_start(start, strict=True, tries=25)
+        except Exception:
+            sentence = None
+    if sentence is None:
+        sentence = text.make_short_sentence(max_chars, tries=25)
+    if sentence is None:
+        sentence = text.make_sentence(tries=25)
+    return sentence or ''
+
+
+class ChatModel:
+    """Chain of one chat"""
+    def __init__(self, model: Model, seq: int):
+        """
+        :param model: chain transitions
+        :param seq: sequence number of the last learned message
+        """
+        self.model = model
+        self.seq = seq
+        self.saved_seq = seq
+        self.busy = 0
+        self.pending: List[Tuple[int, str, Removed]] = []
+
+
+class MarkovCache:
+    """LRU of hot chat chains, learned incrementally
+
+    Cold chains are saved compressed in the database and loaded back with
+    messages that were stored after saving. Messages of cold chats are kept
+    to forget evicted messages on load, they are learned when a sentence is
+    needed or the chat is caught up, which bot does every MESSAGE_STATE messages.
+    Chains are not changed while executor generates sentence from them or
+    serializes them, messages that arrive meanwhile are learned after.
+    """
+    def __init__(self, db: DB, max_size: int = 64, state_size: int = 2):
+        """
+        :param db: database
+        :param max_size: maximum of chains kept in memory
+        :param state_size: count of words in state
+        """
+        self.db = db
+        self.max_size = max_size
+        self.state_size = state_size
+        self.hits = 0
+        self.loads = 0
+        self.deferred = 0
+        self._data: 'OrderedDict[int, ChatModel]' = OrderedDict()
+        self._deferred: Dict[int, List[Tuple[int, str, Removed]]] = {}
+
+    def learn(self, chat_id: int, seq: int, text: str, removed: Removed) -> NoReturn:
+        """Adds stored message to chain and forgets evicted ones
+
+        :param chat_id: unique chat ID
+        :param seq: message sequence number
+        :param text: message text
+        :param removed: (seq, text) of evicted messages
+        """
+        chat = self._data.get(chat_id)
+        if chat is None:
+            self.deferred += 1
+            self._deferred.setdefault(chat_id, []).append((seq, text, removed))
+            return
+        self.hits += 1
+        self._data.move_to_end(chat_id)
+        if chat.busy:
+            chat.pending.append((seq, text, removed))
+        else:
+            self._apply(chat, seq, text, removed)
+
+    async def sentence(self, chat_id: int, start: Optional[str] = None, max_chars: int = 140) -> str:
+        """Generates sentence in executor
+
+        :param chat_id: unique chat ID
+        :param start: first word of sentence if it can begin sentence
+        :param max_chars: preferred maximum of characters
+        """
+        chat = await self._get(chat_id)
+        return await self._in_executor(chat, make_sentence, chat.model, self.state_size, start, max_chars)
+
+    async def catch_up(self, chat_id: int) -> NoReturn:
+        """Loads chain and learns deferred messages of chat
+
+        :param chat_id: unique chat ID
+        """
+        await self._get(chat_id)
+
+    async def flush(self) -> NoReturn:
+        """Saves changed chains"""
+        # Evicted messages of cold chats are not stored, so they are forgotten now
+        for chat_id, deferred in list(self._deferred.items()):
+            if any(removed for _, _, removed in deferred):
+                await self._get(chat_id)
+        for chat_id, chat in list(self._data.items()):
+            await self._save(chat_id, chat)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns size and counters"""
+        return {'size': len(self._data), 'hits': self.hits, 'loads': self.loads, 'deferred': self.deferred}
+
+    async def _get(self, chat_id: int) -> ChatModel:
+        chat = self._data.get(chat_id)
+        if chat is not None:
+            self.hits += 1
+            self._data.move_to_end(chat_id)
+            return chat
+        self.loads += 1
+        saved = await self.db.get_markov(chat_id)
+        if saved is None:
+            chat = ChatModel({}, 0)
+        else:
+            chat = ChatModel(await get_running_loop().run_in_executor(None, loads, saved[1]), saved[0])
+        saved_seq = chat.seq
+        for seq, text in await self.db.get_phrases(chat_id, chat.seq):
+            self._apply(chat, seq, text, [])
+        # Another coroutine could load the chain while this one waited
+        if chat_id in self._data:
+            return self._data[chat_id]
+        self._data[chat_id] = chat
+        for seq, text, removed in self._deferred.pop(chat_id, []):
+            if seq <= chat.seq:
+                # Messages evicted before reading phrases are only in the saved chain
+                removed = [i for i in removed if i[0] <= saved_seq]
+            self._apply(chat, seq, text, removed)
+        await self._evict()
+        return chat
+
+    async def _evict(self) -> NoReturn:
+        for chat_id in list(self._data)[:max(len(self._data) - self.max_size, 0)]:
+            chat = self._data[chat_id]
+            if chat.busy:
+                continue
+            del self._data[chat_id]
+            await self._save(chat_id, chat)
+
+    async def _save(self, chat_id: int, chat: ChatModel) -> NoReturn:
+        if chat.seq == chat.saved_seq:
+            return
+        seq = chat.seq
+        try:
+            data = await self._in_executor(chat, dumps, chat.model)
+            await self.db.save_markov(chat_id, seq, data)
+            chat.saved_seq = seq
+        except Exception as e:
+            print(f"Failed to save markov chain {chat_id}: {e!r}")
+
+    async def _in_executor(self, chat: ChatModel, function: Callable[..., T], *args) -> T:
+        chat.busy += 1
+        try:
+            return await get_running_loop().run_in_executor(None, function, *args)
+        finally:
+            chat.busy -= 1
+            if not chat.busy:
+                pending, chat.pending = chat.pending, []
+                for item in pending:
+                    self._apply(chat, *item)
+
+    def _apply(self, chat: ChatModel, seq: int, text: str, removed: Removed) -> NoReturn:
+        # Messages replayed on load are not learned twice
+        if seq > chat.seq:
+            chat.seq = seq
+            for state, word in runs(text, self.state_size):
+                follows = chat.model.setdefault(state, {})
+                follows[word] = follows.get(word, 0) + 1
+        for old_seq, old in removed:
+            # Message evicted before it was learned is not in chain
+            if old_seq > chat.seq:
+                continue
+            for state, word in runs(old, self.state_size):
+                follows = chat.model.get(state)
+                if follows is None or word not in follows:
+                    continue
+                follows[word] -= 1
+                if follows[word] <= 0:
+                    del follows[word]
+                    if not follows:
+                        del chat.model[state]
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Provides Router class"""
+from inspect import signature
+from re import Match, Pattern, compile, IGNORECASE
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class Route:
+    """Command pattern with its handler"""
+    def __init__(self, index: int, pattern: Pattern, handler: Handler):
+        """
+        :param index: registration order, earlier routes win
+        :param pattern: pattern matched at the beginning of message
+        :param handler: coroutine function called with message, pattern groups and context
+        """
+        self.index = index
+        self.pattern = pattern
+        self.handler = handler
+        self.params = set(signature(handler).parameters)
+
+
+class Router:
+    """Routes messages to command handlers by first characters
+
+    Command keywords are stored in a character trie, so a message that does
+    not start with any keyword is rejected after a few dict lookups. Only
+    routes of matched keywords run their patterns, in registration order.
+    """
+    END = ''
+
+    def __init__(self):
+        self.routes: List[Route] = []
+        self._trie: Dict[str, Any] = {}
+
+    def command(self, pattern: str, *keywords: str) -> Callable[[Handler], Handler]:
+        """Registers handler
+
+        :param pattern: case-insensitive pattern matched at the beginning of message,
+            its groups are passed to handler as positional arguments
+        :param keywords: words which message starts with after optional slash
+        """
+        def decorator(handler: Handler) -> Handler:
+            route = Route(len(self.routes), compile(pattern, IGNORECASE), handler)
+            self.routes.append(route)
+            for keyword in keywords:
+                node = self._trie
+                for char in keyword.lower():
+                    node = node.setdefault(char, {})
+                node.setdefault(Router.END, []).append(route)
+            return handler
+        return decorator
+
+    def candidates(self, text: str) -> List[Route]:
+        """Returns routes of keywords which text starts with
+
+        :param text: message text
+        """
+        text = text.lstrip()
+        if text.startswith('/'):
+            text = text[1:].lstrip()
+        routes = []
+        node = self._trie
+        for char in text:
+            node = node.get(char.lower())
+            if node is None:
+                break
+            routes += node.get(Router.END, ())
+        return sorted(routes, key=lambda route: route.index)
+
+    def find(self, text: str) -> Optional[Tuple[Route, Match]]:
+        """Returns the first route which pattern matches text
+
+        :param text: message text
+        """
+        for route in self.candidates(text):
+            match = route.pattern.match(text)
+            if match is not None:
+                return route, match
+        return None
+
+    async def dispatch(self, msg: Any, **context: Callable[[], Awaitable[Any]]) -> bool:
+        """Calls handler of message
+
+        :param msg: message
+        :param context: functions returning awaitable values passed to handlers which accept them by name,
+            they are called only for such handlers
+        :return: False when message is not a command
+        """
+        found = self.find(msg.text)
+        if found is None:
+            return False
+        route, match = found
+        kwargs = {k: await v() for k, v in context.items() if k in route.params}
+        await route.handler(msg, *match.groups(), **kwargs)
+        return True
@@ -1,9 +1,28 @@
+from asyncio import Event, gather, run, sleep
+from contextlib import closing
+from sqlite3 import connect
+from os.path import join
+from re import findall
+from tempfile import mkdtemp
+from types import SimpleNamespace
 from unittest import main, TestCase
 from college_api import CollegeAPI
+from college_api.aio import ACollegeAPI
+from college_api.cache import TimetableCache
+from college_api.diff import Change, diff_timetables
+from college_api.groups import GroupIndex
+from broadcast import Broadcaster
+from db import DB
+from db.leaderboard import Leaderboard
+from db.writer import Writer
+from db.types import User
+from router import Router
 
 
 class CollegeAPITests(TestCase):
-    api = CollegeAPI()
+    @classmethod
+    def setUpClass(cls):
+        cls.api = CollegeAPI(snapshot=join(mkdtemp(), 'courses.json'))
 
     def test_get_courses(self):
         print(self.api.get_courses())
@@ -16,5 +35,219 @@ class CollegeAPITests(TestCase):
         print(self.api.get_day(264, 5))
 
 
+class CoalescingTests(TestCase):
+    def test_concurrent_calls(self):
+        api = ACollegeAPI(snapshot=None)
+        urls = []
+
+        async def request(url):
+            urls.append(url)
+            await sleep(0.01)
+            return {'week_number': 1}
+        api._request = request
+
+        async def fetch():
+            results = await gather(*[api.get_timetable(264) for _ in range(5)], api.get_timetable(265))
+            # finished request is not shared with later calls
+            await api.get_timetable(264)
+            return results
+        results = run(fetch())
+        self.assertEqual(results[0], {'week_number': 1})
+        self.assertEqual(sorted(urls), [f'{CollegeAPI.URL}timetable/264'] * 2 + [f'{CollegeAPI.URL}timetable/265'])
+        self.assertEqual(api.stats()['coalesced'], 4)
+
+
+class TimetableCacheTests(TestCase):
+    def test_lru_eviction(self):
+        cache = TimetableCache(max_size=2)
+        cache.put((1, None), {'week_number': 1})
+        cache.put((2, None), {'week_number': 1})
+        cache.lookup((1, None))
+        cache.put((3, None), {'week_number': 1})
+        self.assertEqual(cache.lookup((2, None)), (None, False))
+        self.assertEqual(cache.lookup((1, None)), ({'week_number': 1}, True))
+
+    def test_stale(self):
+        cache = TimetableCache(ttl=0, stale_ttl=60)
+        cache.put((1, 2), {'week_number': 2})
+        self.assertEqual(cache.lookup((1, 2)), ({'week_number': 2}, False))
+        self.assertEqual(cache.stats()['stale_hits'], 1)
+
+
+class GroupIndexTests(TestCase):
+    index = GroupIndex([
+        {'groups': [{'id': 1, 'title': 'ИС.20.01'}, {'id': 2, 'title': 'ИС.20.02'}]},
+        {'groups': [{'id': 3, 'title': 'ПР.21.01'}]},
+    ])
+
+    def test_exact(self):
+        self.assertEqual(self.index.find('ис 20-02')['id'], 2)
+
+    def test_prefix(self):
+        self.assertEqual(self.index.find('пр.21')['id'], 3)
+        self.assertIsNone(self.index.find('И'))
+        self.assertIsNone(self.index.find('ис.20'))
+
+    def test_suggest(self):
+        self.assertIsNone(self.index.find('ис.2о.01'))
+        self.assertEqual(self.index.suggest('ис.2о.01')['id'], 1)
+        self.assertIsNone(self.index.suggest('XYZ.99'))
+        for name in ('ИС.20.03', 'ИС.22.01', 'ПР.20.01'):
+            self.assertIsNone(self.index.find(name))
+            self.assertIsNone(self.index.suggest(name))
+
+
+class DiffTests(TestCase):
+    @staticmethod
+    def lesson(number, title, teacher='Иванов', classroom='101'):
+        return {'time': [number, '08:30', '10:00'], 'title': title, 'teacher': teacher, 'classroom': classroom}
+
+    def test_diff(self):
+        old = {'week_number': 1, 'days': [
+            {'title': 'Пн', 'lessons': [self.lesson('1', 'Математика'), self.lesson('2', 'Физика')]},
+            {'title': 'Вт', 'lessons': [self.lesson('1', 'История')]},
+        ]}
+        new = {'week_number': 1, 'days': [
+            {'title': 'Пн', 'lessons': [self.lesson('1', 'Математика', classroom='202')]},
+            {'title': 'Вт', 'lessons': [self.lesson('3', 'Физика'), self.lesson('4', 'Химия')]},
+        ]}
+        changes = {(i.kind, i.lesson['title']) for i in diff_timetables(old, new)}
+        self.assertEqual(changes, {
+            (Change.CLASSROOM, 'Математика'), (Change.MOVED, 'Физика'),
+            (Change.ADDED, 'Химия'), (Change.REMOVED, 'История'),
+        })
+        self.assertEqual(diff_timetables(old, old), [])
+
+
+class WriterTests(TestCase):
+    def test_group_commit(self):
+        path = join(mkdtemp(), 'writer.db')
+        writer = Writer(path, window=0.2)
+
+        def insert(value):
+            def job(db):
+                db.execute('INSERT INTO item VALUES (?)', (value,))
+                if value == 3:
+                    raise ValueError(value)
+                return value
+            return job
+
+        async def write():
+            await writer.submit(lambda db: db.execute('CREATE TABLE item (value INTEGER)'))
+            return await gather(*[writer.submit(insert(i)) for i in range(6)], return_exceptions=True)
+        results = run(write())
+        writer.close()
+        self.assertEqual(results[:3], [0, 1, 2])
+        self.assertIsInstance(results[3], ValueError)
+        # failed job is rolled back to its savepoint, the others are committed together
+        self.assertEqual(writer.stats()['commits'], 2)
+        self.assertEqual(writer.stats()['failed'], 1)
+        with closing(connect(path)) as db:
+            self.assertEqual([i for i, in db.execute('SELECT value FROM item ORDER BY value')], [0, 1, 2, 4, 5])
+
+
+class Users:
+    """users.get of VK API"""
+    async def get(self, user_ids):
+        return [SimpleNamespace(id=uid, first_name=f'user{uid}') for uid in user_ids]
+
+
+class VoteTests(TestCase):
+    def test_cooldown(self):
+        db = DB(SimpleNamespace(users=Users()), join(mkdtemp(), 'chats.db'), window=0.01)
+
+        async def vote():
+            await gather(db.get_or_add_user_hate_niggers(1), db.get_or_add_user_hate_niggers(2))
+            # only one of simultaneous votes passes the cooldown
+            results = await gather(*[db.vote(1, 3, 1, 60, 2000000001) for _ in range(5)])
+            other = await db.vote(2, 3, -1, 60)
+            return results, other, await db.get_chat_users(2000000001, 10)
+        results, other, chat_users = run(vote())
+        db.close()
+        voted = [user for user, _ in results if user is not None]
+        self.assertEqual([(i.uid, i.nickname, i.count) for i in voted], [(3, 'user3', 1)])
+        self.assertTrue(all(0 < wait <= 60 for user, wait in results if user is None))
+        self.assertEqual(other[0].count, 0)
+        self.assertEqual([(i.uid, i.count) for i in chat_users], [(3, 1)])
+
+
+class BroadcastAPI:
+    """VK API which fails the first execute request"""
+    def __init__(self):
+        self.calls = []
+        self.reports = []
+        self.reported = Event()
+        self.messages = SimpleNamespace(send=self.send)
+
+    async def request(self, method, data):
+        self.calls.append(data['code'])
+        if len(self.calls) == 1:
+            raise ConnectionError('first request fails')
+        chunks = findall(r'"peer_ids": "([\d,]+)"', data['code'])
+        return {'response': [[{'peer_id': int(i), 'message_id': 1} for i in chunk.split(',')] for chunk in chunks]}
+
+    async def send(self, **kwargs):
+        self.reports.append(kwargs['message'])
+        self.reported.set()
+
+
+class BroadcasterTests(TestCase):
+    def test_batches_and_resume(self):
+        db = DB(None, join(mkdtemp(), 'chats.db'), window=0.01)
+        api = BroadcastAPI()
+
+        async def broadcast():
+            await db.run(lambda c: c.executemany(
+                "INSERT INTO chat VALUES (?, 0, '', '', '', '', '')", [(2000000000 + i,) for i in range(250)]
+            ))
+            broadcaster = Broadcaster(api, db, concurrency=2, rate=1000, backoff=0, calls=2, peers=50)
+            broadcast_id, count = await broadcaster.start('text', 1)
+            await api.reported.wait()
+            # interrupted broadcast continues from unsent batches
+            api.reported.clear()
+            resumed = await db.create_broadcast('resumed', 1, 3, ['1', '2', '3'])
+            await db.finish_batch(resumed, 0, True, 1, 0)
+            await Broadcaster(api, db, rate=1000).resume()
+            await api.reported.wait()
+            return count
+        count = run(broadcast())
+        db.close()
+        self.assertEqual(count, 250)
+        # 3 batches of up to 2 calls of 50 peers, the first one is sent twice
+        self.assertEqual(sorted(len(findall('API.messages.send', code)) for code in api.calls[:4]), [1, 2, 2, 2])
+        # only 2 of 3 batches are left to resume
+        self.assertEqual(len(api.calls), 6)
+        self.assertIn('доставить 250 из 250, ошибка 0', api.reports[0])
+        self.assertIn('доставить 3 из 3, ошибка 0', api.reports[1])
+
+
+class LeaderboardTests(TestCase):
+    def test_update(self):
+        board = Leaderboard(2)
+        self.assertIsNone(board.get(2))
+        board.load([User(1, 'a', 5, 0), User(2, 'b', 3, 0)])
+        board.update(User(3, 'c', 4, 0))
+        self.assertEqual([i.uid for i in board.get(2)], [1, 3])
+        board.update(User(3, 'c', 6, 0))
+        self.assertEqual([i.uid for i in board.get(2)], [3, 1])
+        # user outside could outrank the last one now
+        board.update(User(1, 'a', 0, 0))
+        self.assertIsNone(board.get(2))
+
+
+class RouterTests(TestCase):
+    def test_find(self):
+        router = Router()
+
+        async def handler(*_):
+            pass
+        router.command(r'/?(?:time)\s+(#[0-9a-f]{6})', 'time')(handler)
+        router.command(r'/?(?:timetable)', 'timetable')(handler)
+        route, match = router.find('/Time #ffffff')
+        self.assertEqual((route.index, match.groups()), (0, ('#ffffff',)))
+        self.assertEqual(router.find('timetable')[0].index, 1)
+        self.assertIsNone(router.find('what time is it'))
+
+
 if __name__ == '__main__':
     main(verbosity=2)